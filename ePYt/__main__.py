@@ -0,0 +1,159 @@
+import argparse
+import json
+import sys
+
+from ePYt.epytlib import analysis, annotator, daemon, domain, \
+    preanalysis, profiler, source
+
+
+def add_analyzer_arguments(parser):
+    parser.add_argument('dir_path', help="directory to analyze")
+    parser.add_argument('--cache-dir', help="directory of on-disk caches")
+    parser.add_argument('--jobs', type=int, help="number of worker processes")
+    parser.add_argument('--timeout', type=float,
+                        help="seconds allowed to execute each module")
+    parser.add_argument('--typedef-mode', default=preanalysis.DYNAMIC,
+                        choices=(preanalysis.DYNAMIC, preanalysis.STATIC))
+
+
+def serve(args):
+    address = args.port if args.socket is None else args.socket
+    analysis_daemon = daemon.AnalysisDaemon(
+        args.dir_path, cache_dir=args.cache_dir, jobs=args.jobs,
+        timeout=args.timeout, typedef_mode=args.typedef_mode)
+    daemon.serve(analysis_daemon, address)
+
+
+def stream(args):
+    analyzer = analysis.Analyzer(
+        args.dir_path, cache_dir=args.cache_dir, jobs=args.jobs,
+        timeout=args.timeout, typedef_mode=args.typedef_mode, lazy=True)
+    output = sys.stdout if args.output is None else open(args.output, 'w')
+    try:
+        for key, arg_types in analyzer.iter_results():
+            record = analysis.AnalysisResult.make_record(key, arg_types)
+            output.write(json.dumps(record) + '\n')
+            output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+def format_text(record):
+    name = record['function']
+    if record['class'] is not None:
+        name = f"{record['class']}.{name}"
+    args = ', '.join(f"{arg_key}: {' | '.join(names) or '?'}"
+                     for arg_key, names in record['arg_types'].items())
+    return f"{record['path']}: {name}({args})"
+
+
+def write_phase_times(prof, output):
+    total_time = prof.get_total_time()
+    phase_times = prof.get_phase_times()
+    phase_times['other'] = total_time - sum(phase_times.values())
+    output.write("phase times:\n")
+    for name, elapsed in phase_times.items():
+        percent = 100 * elapsed / total_time if total_time else 0.0
+        output.write(f"  {name:<18}{elapsed:10.3f}s {percent:6.1f}%\n")
+    output.write(f"  {'total':<18}{total_time:10.3f}s\n")
+    if prof.counters:
+        output.write("counters:\n")
+    for name, count in prof.counters.items():
+        output.write(f"  {name:<22}{count:12d}\n")
+
+
+# Records are written to stdout and phase times to stderr
+def analyze(args):
+    prof = profiler.enable()
+    try:
+        source_store = source.SourceStore(args.include, args.exclude)
+        analyzer = analysis.Analyzer(
+            args.dir_path, cache_dir=args.cache_dir, jobs=args.jobs,
+            timeout=args.timeout, typedef_mode=args.typedef_mode,
+            source_store=source_store, interprocedural=args.interprocedural,
+            call_sites=args.call_sites, narrow_seeds=args.narrow_seeds)
+        if args.annotate:
+            annotator.Annotator.annotate_dir(args.dir_path, analyzer.result,
+                                             source_store)
+    finally:
+        # Hash-consing of this process only, not of worker processes
+        for name in ('value_hits', 'value_misses', 'cache_hits',
+                     'cache_misses'):
+            prof.count(f"domain.{name}",
+                       getattr(domain.value_table, name))
+        profiler.disable()
+    for key, arg_types in analyzer.result.arg_types.items():
+        record = analysis.AnalysisResult.make_record(key, arg_types)
+        if args.format == 'json':
+            sys.stdout.write(json.dumps(record) + '\n')
+        else:
+            sys.stdout.write(format_text(record) + '\n')
+    write_phase_times(prof, sys.stderr)
+    if args.profile_json is not None:
+        prof.write_json(args.profile_json)
+    if args.profile_collapsed is not None:
+        prof.write_collapsed(args.profile_collapsed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m ePYt')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = subparsers.add_parser(
+        'serve', help="serve inference requests with warm caches")
+    add_analyzer_arguments(serve_parser)
+    address = serve_parser.add_mutually_exclusive_group(required=True)
+    address.add_argument('--socket', help="Unix socket path to listen on")
+    address.add_argument('--port', type=int,
+                         help="localhost TCP port to listen on")
+    serve_parser.set_defaults(func=serve)
+
+    stream_parser = subparsers.add_parser(
+        'stream', help="write inferred types as JSON Lines while analyzing")
+    add_analyzer_arguments(stream_parser)
+    stream_parser.add_argument('--output', '-o',
+                               help="file to write to instead of stdout")
+    stream_parser.set_defaults(func=stream)
+
+    analyze_parser = subparsers.add_parser(
+        'analyze', help="analyze a project once and report phase times")
+    add_analyzer_arguments(analyze_parser)
+    analyze_parser.add_argument('--include', action='append', default=[],
+                                help="glob of files to analyze, relative to "
+                                "dir_path (repeatable)")
+    analyze_parser.add_argument('--exclude', action='append', default=[],
+                                help="glob of files or directories to skip, "
+                                "relative to dir_path (repeatable)")
+    analyze_parser.add_argument('--annotate', action='store_true',
+                                help="write annotated sources to "
+                                "<dir_path>.annotated")
+    analyze_parser.add_argument('--interprocedural', action='store_true',
+                                help="apply the attributes required by "
+                                "called project functions to their arguments "
+                                "(not with --jobs)")
+    analyze_parser.add_argument('--call-sites', action='store_true',
+                                help="add the types of literals and "
+                                "constructor calls passed to project "
+                                "functions to the types matched for their "
+                                "arguments")
+    analyze_parser.add_argument('--narrow-seeds', action='store_true',
+                                help="with --call-sites, infer arguments "
+                                "with such types having their attributes "
+                                "as those types only, without matching")
+    analyze_parser.add_argument('--format', default='text',
+                                choices=('json', 'text'))
+    analyze_parser.add_argument('--profile-json',
+                                help="file to write phase times, per module "
+                                "exec times and counters to as JSON")
+    analyze_parser.add_argument('--profile-collapsed',
+                                help="file to write phase times to as "
+                                "collapsed stacks for flame graphs")
+    analyze_parser.set_defaults(func=analyze)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1 @@
+# This file is intentionally to be blank
@@ -0,0 +1,50 @@
+# Peak RSS of Analyzer with AnalysisResult against the former whole-result
+# deepcopy of file infos, each measured in a fresh process
+# Run with: python -m ePYt.benchlib.analysis_bench [file_count]
+import resource
+import subprocess
+import sys
+import tempfile
+from copy import deepcopy
+from pathlib import Path
+from time import perf_counter
+
+from ePYt.epytlib import analysis
+from ePYt.benchlib import preanalysis_bench
+
+VARIANTS = ('result', 'deepcopy')
+
+
+def run_child(variant, dir_path):
+    start = perf_counter()
+    analyzer = analysis.Analyzer(dir_path)
+    # What Analyzer.analyze used to do, the copy counts in the peak RSS
+    # even once dropped
+    if variant == 'deepcopy':
+        deepcopy(analyzer.file_infos)
+    elapsed = perf_counter() - start
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(elapsed, max_rss)
+
+
+def main(argv):
+    if argv and argv[0] == '--child':
+        run_child(argv[1], argv[2])
+        return
+    file_count = int(argv[0]) if argv else 1000
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        dir_path = preanalysis_bench.make_project(
+            Path(tmp_dir) / 'bench_target', file_count=file_count)
+        print(f"{'variant':>9} {'time (s)':>9} {'peak RSS (MiB)':>15}")
+        for variant in VARIANTS:
+            output = subprocess.run(
+                [sys.executable, '-m', 'ePYt.benchlib.analysis_bench',
+                 '--child', variant, str(dir_path)],
+                capture_output=True, text=True, check=True).stdout
+            elapsed, max_rss = output.split()
+            print(f"{variant:>9} {float(elapsed):>9.2f} "
+                  f"{int(max_rss) / 1024:>15.1f}")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,63 @@
+# Join and compare throughput of bitset HasAttr against the former list one
+# Run with: python -m ePYt.benchlib.domain_bench
+import random
+from copy import deepcopy
+from timeit import timeit
+
+from ePYt.epytlib import domain
+
+
+class ListHasAttr:
+    def __init__(self, properties=(), methods=()):
+        self.properties = list(properties)
+        self.methods = list(methods)
+
+    def join(self, other):
+        new_type = deepcopy(self)
+        new_type.properties.extend(other.properties)
+        new_type.methods.extend(other.methods)
+        new_type.properties = list(set(new_type.properties))
+        new_type.methods = list(set(new_type.methods))
+        return new_type
+
+    def __le__(self, other):
+        return self.properties <= other.properties and \
+               self.methods <= other.methods
+
+    def __eq__(self, other):
+        return self.properties == other.properties and \
+               self.methods == other.methods
+
+
+def make_pairs(cls, count, size, seed=0):
+    rand = random.Random(seed)
+    names = [f"attr_{i}" for i in range(size * 4)]
+    pairs = []
+    for _ in range(count):
+        pair = []
+        for _ in range(2):
+            pair.append(
+                cls(rand.sample(names, size), rand.sample(names, size)))
+        pairs.append(pair)
+    return pairs
+
+
+def bench(cls, count, size, number):
+    pairs = make_pairs(cls, count, size)
+    join = timeit(lambda: [a.join(b) for a, b in pairs], number=number)
+    compare = timeit(lambda: [(a <= b, a == b) for a, b in pairs],
+                     number=number)
+    total = count * number
+    return total / join, total / compare
+
+
+def main(count=1000, number=10):
+    print(f"{'size':>6} {'impl':>8} {'joins/s':>12} {'compares/s':>12}")
+    for size in (2, 8, 32, 128):
+        for name, cls in (('list', ListHasAttr), ('bitset', domain.HasAttr)):
+            joins, compares = bench(cls, count, size, number)
+            print(f"{size:>6} {name:>8} {joins:>12.0f} {compares:>12.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+# Retained memory and Semantic time of Graph against CompactGraph on one
+# huge generated function
+# Run with: python -m ePYt.benchlib.graph_bench [block_count]
+import ast
+import sys
+import tracemalloc
+from time import perf_counter
+
+from ePYt.epytlib import analysis, semantic
+
+
+def make_function(block_count):
+    lines = ["def func(a, b):"]
+    for index in range(block_count):
+        lines += [
+            f"    a.method{index % 50}()",
+            f"    if b.prop{index % 30} > {index}:",
+            f"        b.other{index % 20}()",
+            f"    else:",
+            f"        a.prop{index % 40}",
+        ]
+    return ast.parse('\n'.join(lines)).body[0]
+
+
+def measure(node, compact):
+    tracemalloc.start()
+    func_def = analysis.FuncDef(node, compact=compact)
+    func_def.graph  # Built on first use
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    start = perf_counter()
+    semantic.Semantic(func_def)
+    return retained, perf_counter() - start, len(func_def.graph.nodes)
+
+
+def main(argv):
+    block_count = int(argv[0]) if argv else 5000
+    node = make_function(block_count)
+    print(f"{'graph':>8} {'nodes':>7} {'retained (KiB)':>15} "
+          f"{'semantic (s)':>13}")
+    for name, compact in (('objects', False), ('compact', True)):
+        retained, elapsed, node_count = measure(node, compact)
+        print(f"{name:>8} {node_count:>7} {retained / 1024:>15.0f} "
+              f"{elapsed:>13.3f}")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,43 @@
+# Incremental Analyzer runs after editing one file, against a cold run
+# Run with: python -m ePYt.benchlib.incremental_bench [file_count]
+import sys
+import tempfile
+from pathlib import Path
+from time import perf_counter
+
+from ePYt.epytlib import analysis
+from ePYt.benchlib import preanalysis_bench
+
+
+def run(name, dir_path, cache_dir):
+    start = perf_counter()
+    analyzer = analysis.Analyzer(dir_path, cache_dir=cache_dir)
+    elapsed = perf_counter() - start
+    print(f"{name:>12} {elapsed:>9.3f} {analyzer.lifted_count:>7} "
+          f"{analyzer.matched_count:>8}")
+
+
+def main(argv):
+    file_count = int(argv[0]) if argv else 300
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        dir_path = preanalysis_bench.make_project(
+            Path(tmp_dir) / 'bench_target', file_count=file_count)
+        cache_dir = Path(tmp_dir) / 'cache'
+        edited_path = dir_path / f"module{file_count // 2}.py"
+        print(f"{'run':>12} {'time (s)':>9} {'lifted':>7} {'matched':>8}")
+        run('cold', dir_path, cache_dir)
+        run('unchanged', dir_path, cache_dir)
+        # Body edit: one function changes, user types do not
+        edited_path.write_text(edited_path.read_text().replace(
+            'return x + self.attr0', 'return x * self.attr0'))
+        run('edit body', dir_path, cache_dir)
+        # New method: user types change, so every function is matched again
+        edited_path.write_text(edited_path.read_text() +
+                               '\n    def added(self, y):\n'
+                               '        return y.added\n')
+        run('add method', dir_path, cache_dir)
+        run('no cache', dir_path, None)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,55 @@
+# Fixpoint evaluations and iterations on deeply nested loops, with and
+# without widening at loop headers
+# Run with: python -m ePYt.benchlib.loop_bench [max_depth]
+import ast
+import logging
+import sys
+from time import perf_counter
+
+from ePYt.epytlib import analysis, semantic
+from ePYt.benchlib import preanalysis_bench
+
+ARGS = ['x', 'y', 'z']
+
+
+# Loops nested depth deep, each level using attributes of its own
+def make_function(depth):
+    lines = preanalysis_bench.make_body(ARGS, 0, depth, 0, depth, '    ')
+    source = f"def func({', '.join(ARGS)}):\n" + '\n'.join(lines)
+    return analysis.FuncDef(ast.parse(source).body[0])
+
+
+class UnwidenedSemantic(semantic.Semantic):
+    widening_delay = semantic.Semantic.max_node_evaluations
+
+
+def measure(semantic_class, func_def, mode):
+    start = perf_counter()
+    result = semantic_class(func_def, mode)
+    elapsed = perf_counter() - start
+    return result, elapsed
+
+
+def main(argv):
+    # Runs short of the fixed point are shown in the fixed column instead
+    logging.getLogger(semantic.__name__).setLevel(logging.ERROR)
+    max_depth = int(argv[0]) if argv else 32
+    print(f"{'depth':>5} {'nodes':>6} {'mode':>9} {'widening':>9} "
+          f"{'evals':>7} {'max iter':>9} {'fixed':>6} {'time (ms)':>10}")
+    depth = 1
+    while depth <= max_depth:
+        func_def = make_function(depth)
+        for mode in (semantic.Semantic.WORKLIST, semantic.Semantic.SWEEP):
+            for name, semantic_class in (('on', semantic.Semantic),
+                                         ('off', UnwidenedSemantic)):
+                result, elapsed = measure(semantic_class, func_def, mode)
+                print(f"{depth:>5} {len(func_def.graph.nodes):>6} "
+                      f"{mode:>9} {name:>9} {result.evaluations:>7} "
+                      f"{result.iterations:>9} "
+                      f"{str(result.reached_fixed_point):>6} "
+                      f"{elapsed * 1000:>10.2f}")
+        depth *= 2
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,47 @@
+# Scaling of batch matching against per-argument matching
+# Run with: python -m ePYt.benchlib.match_bench
+import random
+from time import perf_counter
+
+from ePYt.epytlib import preanalysis, type_inferrer
+
+
+def make_user_types(count, attrs_per_type, attr_pool, seed=0):
+    rand = random.Random(seed)
+    user_types = {}
+    for index in range(count):
+        attrs = rand.sample(attr_pool, attrs_per_type)
+        class_ = type(f"Type{index}", (), dict.fromkeys(attrs))
+        typedef = preanalysis.TypeDef(class_)
+        user_types[typedef.class_name] = typedef
+    return user_types
+
+
+def make_lifted_values_attrs(count, attr_pool, seed=1):
+    rand = random.Random(seed)
+    return [rand.sample(attr_pool, rand.randint(1, 3)) for _ in range(count)]
+
+
+def timed(func, *args):
+    start = perf_counter()
+    result = func(*args)
+    return perf_counter() - start, result
+
+
+def main(sizes=((1000, 10000), (10000, 10000), (10000, 100000)),
+         attrs_per_type=20, pool_size=200):
+    attr_pool = [f"attr_{i}" for i in range(pool_size)]
+    print(f"{'types':>6} {'args':>7} {'per-arg (s)':>12} {'batch (s)':>10}")
+    for type_count, arg_count in sizes:
+        inferrer = type_inferrer.TypeInferrer(
+            None, make_user_types(type_count, attrs_per_type, attr_pool))
+        lifted_values_attrs = make_lifted_values_attrs(arg_count, attr_pool)
+        per_arg, expected = timed(
+            lambda: list(map(inferrer.match_candidates, lifted_values_attrs)))
+        batch, matched = timed(inferrer.match_many, lifted_values_attrs)
+        assert matched == expected
+        print(f"{type_count:>6} {arg_count:>7} {per_arg:>12.3f} {batch:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+# Wall time and peak memory of dynamic and static typedef extraction, and a
+# report of where their results differ
+# Run with: python -m ePYt.benchlib.preanalysis_bench [target_dir]
+import sys
+import tempfile
+import tracemalloc
+from pathlib import Path
+from time import perf_counter
+
+from ePYt.epytlib import preanalysis
+
+
+# Statements using args, with if/else nested branch_depth deep and for and
+# while loops alternately nested loop_nesting deep. Attributes refer to
+# members of the generated classes, so arguments have candidate types.
+# Each if is preceded by local_statements statements not using args.
+def make_body(args, class_index, classes_per_file, branch_depth,
+              loop_nesting, indent='        ', local_statements=0):
+    lines = []
+    for level in range(branch_depth):
+        index = (class_index + level) % classes_per_file
+        arg = args[level % len(args)]
+        lines += [f"{indent}local{i} = {level} * {i}"
+                  for i in range(local_statements)]
+        lines += [
+            f"{indent}if {args[0]}.prop{index} > {level}:",
+            f"{indent}    {arg}.method{index}({level})"
+        ]
+        indent += '    '
+    for level in reversed(range(branch_depth)):
+        indent = indent[:-4]
+        index = (class_index + level) % classes_per_file
+        lines += [
+            f"{indent}else:",
+            f"{indent}    {args[-1]}.value{index}"
+        ]
+    for level in range(loop_nesting):
+        index = (class_index + level) % classes_per_file
+        arg = args[level % len(args)]
+        if level % 2 == 0:
+            lines.append(f"{indent}for item{level} in {arg}:")
+        else:
+            lines.append(f"{indent}while {arg}.prop{index}:")
+        indent += '    '
+        lines.append(f"{indent}{arg}.method{index}({level})")
+    return lines
+
+
+# A deterministic project of file_count modules. Every class has
+# methods_per_class methods taking args_per_function arguments besides
+# self, whose bodies are shaped by branch_depth, loop_nesting and
+# local_statements.
+def make_project(dir_path, file_count=50, classes_per_file=10,
+                 methods_per_class=1, branch_depth=0, loop_nesting=0,
+                 args_per_function=1, local_statements=0):
+    dir_path = Path(dir_path)
+    dir_path.mkdir(parents=True, exist_ok=True)
+    args = ['x'] + [f"x{i}" for i in range(1, args_per_function)]
+    for file_index in range(file_count):
+        lines = []
+        # Modules import bases along a binary tree to keep imports shallow
+        base_index = (file_index - 1) // 2
+        if file_index:
+            lines.append(f"from {dir_path.name}.module{base_index} "
+                         f"import Class{base_index}_0")
+        for class_index in range(classes_per_file):
+            base = f"Class{base_index}_0" \
+                if file_index and class_index == 0 else "object"
+            lines += [
+                f"class Class{file_index}_{class_index}({base}):",
+                f"    attr{class_index} = {class_index}",
+                f"    def __init__(self):",
+                f"        self.prop{class_index} = {class_index}",
+                f"    @property",
+                f"    def value{class_index}(self):",
+                f"        return self.prop{class_index}",
+            ]
+            for method_index in range(methods_per_class):
+                name = f"method{class_index}" if method_index == 0 \
+                    else f"method{class_index}_{method_index}"
+                lines.append(f"    def {name}(self, {', '.join(args)}):")
+                lines += make_body(args, class_index + method_index,
+                                   classes_per_file, branch_depth,
+                                   loop_nesting,
+                                   local_statements=local_statements)
+                lines.append(f"        return x + self.attr{class_index}")
+            lines.append("")
+        (dir_path / f"module{file_index}.py").write_text('\n'.join(lines))
+    return dir_path
+
+
+def measure(dir_path, mode):
+    tracemalloc.start()
+    start = perf_counter()
+    typedefs = preanalysis.get_typedefs(dir_path, mode=mode)
+    elapsed = perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return typedefs, elapsed, peak
+
+
+def compare_typedefs(dynamic, static):
+    report = []
+    for name in sorted(set(dynamic) | set(static)):
+        if name not in static:
+            report.append(f"{name}: dynamic only")
+            continue
+        if name not in dynamic:
+            report.append(f"{name}: static only")
+            continue
+        dynamic_type, static_type = dynamic[name].type, static[name].type
+        for kind in ('properties', 'methods'):
+            dynamic_attrs = set(getattr(dynamic_type, kind))
+            static_attrs = set(getattr(static_type, kind))
+            if dynamic_attrs - static_attrs:
+                report.append(f"{name}: {kind} dynamic only: " +
+                              ", ".join(sorted(dynamic_attrs - static_attrs)))
+            if static_attrs - dynamic_attrs:
+                report.append(f"{name}: {kind} static only: " +
+                              ", ".join(sorted(static_attrs - dynamic_attrs)))
+        if dynamic[name].base_class_names != static[name].base_class_names:
+            report.append(f"{name}: bases {dynamic[name].base_class_names}"
+                          f" != {static[name].base_class_names}")
+    return report
+
+
+def run(dir_path):
+    dynamic, dynamic_time, dynamic_peak = measure(dir_path,
+                                                  preanalysis.DYNAMIC)
+    static, static_time, static_peak = measure(dir_path, preanalysis.STATIC)
+    print(f"{'mode':>8} {'typedefs':>9} {'time (s)':>9} {'peak (KiB)':>11}")
+    print(f"{'dynamic':>8} {len(dynamic):>9} {dynamic_time:>9.3f} "
+          f"{dynamic_peak / 1024:>11.0f}")
+    print(f"{'static':>8} {len(static):>9} {static_time:>9.3f} "
+          f"{static_peak / 1024:>11.0f}")
+    report = compare_typedefs(dynamic, static)
+    print(f"{len(report)} differences")
+    print('\n'.join(report))
+
+
+def main(argv):
+    if argv:
+        run(Path(argv[0]))
+        return
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        run(make_project(Path(tmp_dir) / 'bench_target'))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,162 @@
+# End-to-end Analyzer time, peak RSS and fixpoint iterations per function
+# on generated projects, written as JSON so runs on different commits can
+# be compared. Every repeat runs in a fresh process.
+# Run with: python -m ePYt.benchlib.runner [--preset NAME] [-o FILE]
+#           python -m ePYt.benchlib.runner --compare OLD.json NEW.json
+import argparse
+import json
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from time import perf_counter
+
+from ePYt.epytlib import analysis, semantic
+from ePYt.benchlib import preanalysis_bench
+
+# make_project arguments of each preset
+PRESETS = {
+    'small': dict(file_count=20, classes_per_file=5),
+    'wide': dict(file_count=200, classes_per_file=10, methods_per_class=2,
+                 args_per_function=3),
+    'branchy': dict(file_count=50, classes_per_file=5, methods_per_class=2,
+                    branch_depth=8, args_per_function=2),
+    'loopy': dict(file_count=50, classes_per_file=5, methods_per_class=2,
+                  loop_nesting=6, args_per_function=2),
+    'mixed': dict(file_count=50, classes_per_file=5, methods_per_class=2,
+                  branch_depth=4, loop_nesting=2, args_per_function=2,
+                  local_statements=3),
+}
+
+
+# Runs in a fresh process: analyzes dir_path once, then runs Semantic on
+# every function again to count its fixpoint iterations
+def run_child(dir_path, jobs):
+    start = perf_counter()
+    analyzer = analysis.Analyzer(dir_path, jobs=jobs)
+    elapsed = perf_counter() - start
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    iterations = {}
+    evaluations = 0
+    for file_info in analyzer.file_infos:
+        relative_path = file_info.path.relative_to(dir_path).as_posix()
+        for key, func_def in \
+                analysis.AnalysisResult.get_func_defs(file_info):
+            _, class_name, function_name = key
+            result = semantic.Semantic(func_def)
+            name = f"{relative_path}:{class_name}.{function_name}" \
+                if class_name else f"{relative_path}:{function_name}"
+            iterations[name] = result.iterations
+            evaluations += result.evaluations
+    return {
+        'time': elapsed,
+        'peak_rss_kib': max_rss,
+        'functions': len(iterations),
+        'evaluations': evaluations,
+        'iterations': iterations
+    }
+
+
+def run_preset(params, repeat, jobs):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        dir_path = preanalysis_bench.make_project(
+            Path(tmp_dir) / 'bench_target', **params)
+        runs = []
+        for _ in range(repeat):
+            command = [sys.executable, '-m', 'ePYt.benchlib.runner',
+                       '--child', str(dir_path)]
+            if jobs is not None:
+                command += ['--jobs', str(jobs)]
+            output = subprocess.run(command, capture_output=True, text=True,
+                                    check=True).stdout
+            runs.append(json.loads(output))
+    iterations = runs[0]['iterations']
+    times = [x['time'] for x in runs]
+    return {
+        'params': params,
+        'jobs': jobs,
+        'times': times,
+        'time_min': min(times),
+        'time_median': statistics.median(times),
+        'peak_rss_kib': max(x['peak_rss_kib'] for x in runs),
+        'functions': runs[0]['functions'],
+        'evaluations': runs[0]['evaluations'],
+        'iterations_mean': statistics.fmean(iterations.values()),
+        'iterations_max': max(iterations.values()),
+        'iterations': iterations
+    }
+
+
+def get_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'],
+                              capture_output=True, text=True, check=True,
+                              cwd=Path(__file__).parent).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results):
+    print(f"{'preset':>8} {'functions':>9} {'time (s)':>9} "
+          f"{'peak RSS (MiB)':>15} {'iter mean':>10} {'iter max':>9}")
+    for name, preset in results['presets'].items():
+        print(f"{name:>8} {preset['functions']:>9} "
+              f"{preset['time_min']:>9.3f} "
+              f"{preset['peak_rss_kib'] / 1024:>15.1f} "
+              f"{preset['iterations_mean']:>10.2f} "
+              f"{preset['iterations_max']:>9}")
+
+
+def compare(old_path, new_path):
+    old = json.loads(Path(old_path).read_text())
+    new = json.loads(Path(new_path).read_text())
+    print(f"{old['commit']} -> {new['commit']}")
+    print(f"{'preset':>8} {'time':>8} {'peak RSS':>9} {'evaluations':>12}")
+    for name, new_preset in new['presets'].items():
+        if name not in old['presets']:
+            continue
+        old_preset = old['presets'][name]
+        if old_preset['params'] != new_preset['params']:
+            print(f"{name:>8} parameters differ")
+            continue
+        ratios = [new_preset[x] / old_preset[x]
+                  for x in ('time_min', 'peak_rss_kib', 'evaluations')]
+        print(f"{name:>8} {ratios[0]:>7.2f}x {ratios[1]:>8.2f}x "
+              f"{ratios[2]:>11.2f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m ePYt.benchlib.runner')
+    parser.add_argument('--preset', action='append', choices=list(PRESETS),
+                        help="preset to run (repeatable, default all)")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--jobs', type=int)
+    parser.add_argument('--output', '-o', help="file to write results to")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'))
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child is not None:
+        print(json.dumps(run_child(Path(args.child), args.jobs)))
+        return
+    if args.compare is not None:
+        compare(*args.compare)
+        return
+    results = {
+        'commit': get_commit(),
+        'python': sys.version,
+        'machine': platform.machine(),
+        'presets': {}
+    }
+    for name in args.preset or PRESETS:
+        results['presets'][name] = run_preset(PRESETS[name], args.repeat,
+                                              args.jobs)
+    print_results(results)
+    if args.output is not None:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+# Node counts and fixpoint time of dense and sparse Semantic over the
+# functions of a corpus: the generated runner presets and ePYt itself, or
+# the given directories
+# Run with: python -m ePYt.benchlib.sparse_bench [dir_path ...]
+import sys
+import tempfile
+from pathlib import Path
+from time import perf_counter
+
+from ePYt.epytlib import analysis, semantic
+from ePYt.benchlib import preanalysis_bench, runner
+
+
+# Functions with annotated arguments are left out, as AnnotatedType cannot
+# be joined with lifted facts
+def get_func_defs(dir_path):
+    func_defs = []
+    for script_path in sorted(Path(dir_path).rglob('*.py')):
+        file_info = analysis.FileInfo(script_path)
+        func_defs += [
+            func_def for _, func_def in
+            analysis.AnalysisResult.get_func_defs(file_info)
+            if not any(arg.annotation for arg in func_def.args.args)
+        ]
+    return func_defs
+
+
+# Node count, evaluations and the best time of repeat runs
+def measure(func_defs, sparse, repeat=3):
+    times = []
+    for _ in range(repeat):
+        node_count = evaluations = 0
+        start = perf_counter()
+        for func_def in func_defs:
+            result = semantic.Semantic(func_def, sparse=sparse)
+            node_count += len(result.table.keys())
+            evaluations += result.evaluations
+        times.append(perf_counter() - start)
+    return node_count, evaluations, min(times)
+
+
+def run(name, func_defs):
+    dense_nodes, dense_evals, dense_time = measure(func_defs, False)
+    sparse_nodes, sparse_evals, sparse_time = measure(func_defs, True)
+    print(f"{name:>8} {len(func_defs):>9} {dense_nodes:>7} "
+          f"{sparse_nodes:>7} {1 - sparse_nodes / dense_nodes:>8.1%} "
+          f"{dense_evals:>7} {sparse_evals:>7} "
+          f"{dense_time:>6.3f} {sparse_time:>6.3f} "
+          f"{dense_time / sparse_time:>7.2f}x")
+
+
+def main(argv):
+    print(f"{'corpus':>8} {'functions':>9} {'nodes':>7} {'sparse':>7} "
+          f"{'dropped':>8} {'evals':>7} {'sparse':>7} "
+          f"{'time':>6} {'sparse':>6} {'speedup':>8}")
+    if argv:
+        for dir_path in argv:
+            run(Path(dir_path).name, get_func_defs(dir_path))
+        return
+    for name, params in runner.PRESETS.items():
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            dir_path = preanalysis_bench.make_project(
+                Path(tmp_dir) / 'bench_target', **params)
+            run(name, get_func_defs(dir_path))
+    run('ePYt', get_func_defs(Path(__file__).parent.parent))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
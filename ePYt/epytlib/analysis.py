@@ -1,16 +1,38 @@
 import ast
-from copy import deepcopy
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
 from itertools import chain
 from pathlib import Path
-from . import domain, graph, type_inferrer
+import warnings
+from . import cache, callsite, domain, graph, preanalysis, profiler, \
+    source, summary, type_inferrer
 
 
 class FuncDef:
-    def __init__(self, func_def: ast.FunctionDef):
+    # The graph is built when first used. With compact, it is kept as a
+    # graph.CompactGraph
+    def __init__(self, func_def: ast.FunctionDef, compact=False):
+        self.node = func_def
         self.function_name = func_def.name
         self.args = func_def.args
-        self.arg_types = {}
-        self.graph = graph.Graph(func_def.body)
+        self.compact = compact
+        self.built_graph = None
+
+    @property
+    def graph(self):
+        if self.built_graph is None:
+            self.built_graph = graph.Graph(self.node.body)
+            if self.compact:
+                self.built_graph = self.built_graph.to_compact()
+        return self.built_graph
+
+    @graph.setter
+    def graph(self, value):
+        self.built_graph = value
+
+    # Hash of the AST without positions, so moving a function keeps it
+    def get_fingerprint(self):
+        return hashlib.sha256(ast.dump(self.node).encode()).hexdigest()
 
     def __str__(self):
         return f"def {self.function_name}({ast.unparse(self.args)})"
@@ -36,42 +58,496 @@ class ClassDef:
         return f"<ClassDef {str(self)}>"
 
 
+# The file is parsed when its tree or definitions are first used, so that
+# files analyzed in worker processes are not parsed here too
 class FileInfo:
-    def __init__(self, script_path):
+    def __init__(self, script_path, source_store=None):
+        if source_store is None:
+            source_store = source.SourceStore()
         self.path = Path(script_path)
-        self.tree = ast.parse(self.path.read_text())
-        self.func_defs = {}
-        self.class_defs = {}
-        for node in self.tree.body:
-            if isinstance(node, ast.ClassDef):
-                self.class_defs[node.name] = ClassDef(node)
-            elif isinstance(node, ast.FunctionDef):
-                self.func_defs[node.name] = FuncDef(node)
+        self.source_store = source_store
+        # (tree, func_defs, class_defs) once parsed
+        self.definitions = None
+
+    def get_definitions(self):
+        if self.definitions is None:
+            tree = self.source_store.get_tree(self.path)
+            func_defs = {}
+            class_defs = {}
+            for node in tree.body:
+                if isinstance(node, ast.ClassDef):
+                    class_defs[node.name] = ClassDef(node)
+                elif isinstance(node, ast.FunctionDef):
+                    func_defs[node.name] = FuncDef(node)
+            self.definitions = tree, func_defs, class_defs
+            self.source_store = None
+        return self.definitions
+
+    @property
+    def tree(self):
+        return self.get_definitions()[0]
+
+    @property
+    def func_defs(self):
+        return self.get_definitions()[1]
+
+    @property
+    def class_defs(self):
+        return self.get_definitions()[2]
+
+
+# Inferred argument types of analyzed functions, kept apart from the
+# FileInfos, which are never mutated by analysis.
+# Keyed by (file path, class name or None, function name).
+class AnalysisResult:
+    def __init__(self, file_infos):
+        self.file_infos = file_infos
+        self.arg_types = {}
+
+    @staticmethod
+    def make_key(file_info, class_name, function_name):
+        return file_info.path, class_name, function_name
+
+    # All (key, FuncDef) of a FileInfo, methods first
+    @classmethod
+    def get_func_defs(cls, file_info):
+        func_defs = []
+        for class_def in file_info.class_defs.values():
+            for func_def in class_def.func_defs.values():
+                key = cls.make_key(file_info, class_def.class_name,
+                                   func_def.function_name)
+                func_defs.append((key, func_def))
+        for func_def in file_info.func_defs.values():
+            key = cls.make_key(file_info, None, func_def.function_name)
+            func_defs.append((key, func_def))
+        return func_defs
+
+    # JSON serializable form of one function's inferred types
+    @staticmethod
+    def make_record(key, arg_types):
+        path, class_name, function_name = key
+        return {
+            'path': str(path),
+            'class': class_name,
+            'function': function_name,
+            'arg_types': {
+                arg_key: [x.class_name for x in types]
+                for arg_key, types in arg_types.items()
+            }
+        }
+
+    def __getitem__(self, key):
+        return self.arg_types.get(key, {})
+
+    def __setitem__(self, key, value):
+        self.arg_types[key] = value
+
+    def __str__(self):
+        return '\n'.join(map(str, self.arg_types.items()))
+
+    def __repr__(self):
+        return f"<AnalysisResult {str(self)}>"
 
 
 class Analyzer:
     prim_types = [*map(domain.PrimitiveType, domain.PrimitiveType.prim_types)]
+    # Override with a TypeInferrer subclass, which worker processes use too
+    type_inferrer_class = type_inferrer.TypeInferrer
 
-    def __init__(self, dir_path):
+    # With cache_dir, typedefs and per-function results are kept on disk and
+    # only functions whose fingerprint changed are analyzed again, in jobs
+    # worker processes if jobs is set too.
+    # With lazy, nothing is analyzed until iter_results is iterated, and
+    # interprocedural and call_sites, which need every file, are rejected.
+    # With interprocedural, the attributes required by called project
+    # functions are added to the arguments passed to them (see summary).
+    # Summaries are computed in this process, so jobs is rejected, and
+    # cached in cache_dir instead of per-function results.
+    # With call_sites, the classes of literals and constructor calls passed
+    # to a function in the project are added to the types inferred for its
+    # arguments (see callsite). Only calls within dir_path are seen, so
+    # seeds never replace the user types matched as usual, unless
+    # narrow_seeds is set too: arguments are then inferred as the seeds
+    # having their attributes, without matching them against user types.
+    # cache_path, the typedef cache file of earlier versions, is deprecated
+    # in favor of cache_dir.
+    def __init__(self, dir_path, cache_dir=None, jobs=None, timeout=None,
+                 typedef_mode=preanalysis.DYNAMIC, source_store=None,
+                 lazy=False, interprocedural=False, call_sites=False,
+                 narrow_seeds=False, cache_path=None):
+        if lazy and (interprocedural or call_sites):
+            raise ValueError("interprocedural and call_sites need every "
+                             "file, a lazy Analyzer analyzes them in turn")
+        if narrow_seeds and not call_sites:
+            raise ValueError("narrow_seeds narrows to call-site seeds, it "
+                             "needs call_sites")
+        if interprocedural and jobs is not None:
+            raise ValueError("interprocedural analysis runs in one process, "
+                             "jobs is not supported")
+        if cache_path is not None:
+            if cache_dir is not None:
+                raise ValueError("cache_path is deprecated, pass cache_dir "
+                                 "only")
+            warnings.warn("cache_path is deprecated, use cache_dir",
+                          DeprecationWarning, stacklevel=2)
         self.dir_path = Path(dir_path)
-        self.type_inferrer = type_inferrer.TypeInferrer(self.dir_path)
+        if source_store is None:
+            source_store = source.SourceStore()
+        self.source_store = source_store
+        typedef_cache_path = cache_path
+        self.function_cache = None
+        self.interprocedural = interprocedural
+        self.summary_cache_path = None
+        self.call_sites = call_sites
+        self.call_site_cache_path = None
+        self.call_site_index = None
+        if cache_dir is not None:
+            typedef_cache_path = Path(cache_dir) / 'typedefs.json'
+            self.summary_cache_path = Path(cache_dir) / 'summaries.json'
+            self.call_site_cache_path = Path(cache_dir) / 'call_sites.json'
+            self.function_cache = cache.FileCache(
+                Path(cache_dir) / 'functions.json')
+        self.type_inferrer = self.type_inferrer_class(
+            self.dir_path, cache_path=typedef_cache_path, jobs=jobs,
+            timeout=timeout, typedef_mode=typedef_mode,
+            source_store=self.source_store, narrow_seeds=narrow_seeds)
         # Can infer type by calling type_infer.get_type(lineno, colno)
         # self.type_infer = type_infer.TypeInfer(dir_path)
         self.file_infos = []
-        for src_path in self.dir_path.rglob('*.py'):
-            file_info = FileInfo(src_path)
+        self.jobs = jobs
+        # Pool of worker processes kept while iter_results runs
+        self.executor = None
+        # Functions lifted by Semantic and matched against user types
+        self.lifted_count = 0
+        self.matched_count = 0
+        self.result = None
+        if lazy:
+            return
+        for src_path in self.source_store.get_script_paths(self.dir_path):
+            file_info = FileInfo(src_path, self.source_store)
             self.file_infos.append(file_info)
-        self.analyzed_files = self.analyze(self.file_infos)
-        self.table = self.type_inferrer.table
-
-    def analyze(self, file_infos) -> FileInfo:
-        analyzed_files = deepcopy(file_infos)
-        for file_info in analyzed_files:
-            all_func_list = \
-                list(chain(*map(lambda x: x.func_defs.values(),
-                                file_info.class_defs.values())))
-            all_func_list += file_info.func_defs.values()
-            for func_def in all_func_list:
-                inferred_types = self.type_inferrer.infer(func_def)
-                func_def.arg_types = inferred_types
-        return analyzed_files
+        self.result = self.analyze(self.file_infos)
+
+    # Yields (key, inferred types) of each function as soon as its file is
+    # analyzed. A lazy Analyzer keeps neither FileInfos nor results, and
+    # drops the tree of each file once its functions are done. Files are
+    # analyzed as by analyze, one at a time, or with jobs a few per worker
+    # at a time in one pool kept open until the last one.
+    def iter_results(self):
+        if self.result is not None:
+            yield from self.result.arg_types.items()
+            return
+        script_paths = self.source_store.get_script_paths(self.dir_path)
+        chunk_size = 1 if self.jobs is None else self.jobs * 4
+        if self.jobs is not None:
+            self.executor = self.make_executor()
+        try:
+            for start in range(0, len(script_paths), chunk_size):
+                file_infos = [
+                    FileInfo(x, self.source_store)
+                    for x in script_paths[start:start + chunk_size]
+                ]
+                lifted_count, matched_count = \
+                    self.lifted_count, self.matched_count
+                self.lifted_count = self.matched_count = 0
+                result = self.analyze_files(file_infos)
+                self.lifted_count += lifted_count
+                self.matched_count += matched_count
+                yield from result.arg_types.items()
+                for file_info in file_infos:
+                    self.source_store.evict(file_info.path)
+            if self.function_cache is not None:
+                self.function_cache.save()
+        finally:
+            if self.executor is not None:
+                self.executor.shutdown(cancel_futures=True)
+                self.executor = None
+
+    def analyze(self, file_infos) -> AnalysisResult:
+        result = self.analyze_files(file_infos)
+        if self.function_cache is not None:
+            self.function_cache.save()
+        return result
+
+    # With jobs, files are analyzed in that many worker processes, giving the
+    # same result as analyzing them here. With cache_dir too, only the
+    # functions missing from the cache are sent to them. The function cache
+    # is left for the caller to save.
+    def analyze_files(self, file_infos) -> AnalysisResult:
+        if self.interprocedural:
+            return self.analyze_interprocedural(file_infos)
+        if self.function_cache is not None:
+            return self.analyze_incremental(file_infos)
+        if self.jobs is not None:
+            return self.analyze_parallel(file_infos)
+        result = AnalysisResult(file_infos)
+        all_func_list = list(
+            chain(*map(AnalysisResult.get_func_defs, file_infos)))
+        all_seeds = list(map(self.get_seeds, self.get_all_seed_names(
+            file_infos, all_func_list)))
+        all_inferred_types = self.type_inferrer.infer_many(
+            [func_def for _, func_def in all_func_list], all_seeds)
+        for (key, _), inferred_types in zip(all_func_list,
+                                            all_inferred_types):
+            result[key] = inferred_types
+        self.lifted_count = self.matched_count = len(all_func_list)
+        return result
+
+    # {arg_key: [class name]} seeds of each function of all_func_list, empty
+    # unless call_sites is set
+    def get_all_seed_names(self, file_infos, all_func_list):
+        if not self.call_sites:
+            return [{} for _ in all_func_list]
+        self.call_site_index = callsite.CallSiteIndex(
+            self.dir_path, file_infos, all_func_list,
+            self.type_inferrer.user_types, self.call_site_cache_path)
+        return [self.call_site_index.get_seed_names(key)
+                for key, _ in all_func_list]
+
+    def get_seeds(self, seed_names):
+        user_types = self.type_inferrer.user_types
+        return {arg_key: [callsite.get_typedef(user_types, x) for x in names]
+                for arg_key, names in seed_names.items()}
+
+    # Function fingerprints of a file, recomputed when its content changes
+    def get_fingerprints(self, file_info, func_defs):
+        path = file_info.path.relative_to(self.dir_path).as_posix()
+        hashes = {path: cache.hash_file(file_info.path)}
+        fingerprints = self.function_cache.get(path, hashes)
+        if fingerprints is None:
+            fingerprints = [x.get_fingerprint() for _, x in func_defs]
+            self.function_cache.set(path, hashes, fingerprints)
+        return fingerprints
+
+    # Cached lifted attributes are reused for unchanged function fingerprints
+    # and cached matches while the user types fingerprint and the seeds are
+    # unchanged too
+    def analyze_incremental(self, file_infos) -> AnalysisResult:
+        result = AnalysisResult(file_infos)
+        typedef_fingerprint = self.type_inferrer.get_fingerprint()
+        narrow_seeds = self.type_inferrer.narrow_seeds
+        all_func_list = []
+        for file_info in file_infos:
+            func_defs = AnalysisResult.get_func_defs(file_info)
+            all_func_list += zip(func_defs,
+                                 self.get_fingerprints(file_info, func_defs))
+        all_seed_names = self.get_all_seed_names(
+            file_infos, [x for x, _ in all_func_list])
+        entries = [self.function_cache.get(fingerprint, {})
+                   for _, fingerprint in all_func_list]
+        to_lift = [x for (x, _), entry in zip(all_func_list, entries)
+                   if entry is None]
+        all_lifted_attrs = self.lift_many(to_lift)
+        self.lifted_count += len(to_lift)
+        to_match = []
+        for ((key, func_def), fingerprint), entry, seed_names in zip(
+                all_func_list, entries, all_seed_names):
+            if entry is None:
+                entry = {'lifted_attrs': all_lifted_attrs[key]}
+            if entry.get('typedef_fingerprint', None) != \
+                    typedef_fingerprint or \
+                    entry.get('seed_names', {}) != seed_names or \
+                    entry.get('narrow_seeds', False) != narrow_seeds:
+                to_match.append((key, func_def, fingerprint, entry,
+                                 seed_names))
+                continue
+            result[key] = self.get_types(entry['arg_type_names'])
+        if self.type_inferrer.overrides_infer_table():
+            all_inferred_types = self.infer_many(
+                [(key, func_def) for key, func_def, *_ in to_match],
+                [seed_names for *_, seed_names in to_match])
+        else:
+            all_inferred_types = self.type_inferrer.match_lifted_attrs(
+                [entry['lifted_attrs'] for *_, entry, _ in to_match],
+                [self.get_seeds(seed_names)
+                 for *_, seed_names in to_match])
+        for (key, _, fingerprint, entry, seed_names), inferred_types in zip(
+                to_match, all_inferred_types):
+            result[key] = inferred_types
+            entry = dict(entry, typedef_fingerprint=typedef_fingerprint,
+                         seed_names=seed_names, narrow_seeds=narrow_seeds)
+            entry['arg_type_names'] = {
+                arg_key: [x.class_name for x in types]
+                for arg_key, types in inferred_types.items()
+            }
+            self.function_cache.set(fingerprint, {}, entry)
+        self.matched_count = len(to_match)
+        return result
+
+    # {key: {arg_key: attribute names}} of the (key, FuncDef) of func_list,
+    # lifted in worker processes with jobs
+    def lift_many(self, func_list):
+        if self.jobs is None or not func_list:
+            return {key: self.type_inferrer.get_lifted_attrs(func_def)
+                    for key, func_def in func_list}
+        with profiler.phase('analysis workers'):
+            return dict(chain(*self.map_workers(
+                lift_functions, self.get_batches(func_list))))
+
+    # Inferred types of the (key, FuncDef) of func_list with the seed names
+    # of each, in worker processes with jobs
+    def infer_many(self, func_list, all_seed_names):
+        if self.jobs is None or not func_list:
+            return self.type_inferrer.infer_many(
+                [func_def for _, func_def in func_list],
+                list(map(self.get_seeds, all_seed_names)))
+        seed_names = {key: x for (key, _), x in zip(func_list,
+                                                    all_seed_names)}
+        batches = self.get_batches(func_list)
+        with profiler.phase('analysis workers'):
+            inferred_types = dict(chain(*self.map_workers(
+                analyze_functions, batches,
+                [seed_names for _ in batches])))
+        return [self.get_types(inferred_types[key]) for key, _ in func_list]
+
+    # Lists of (key, ast.FunctionDef) of func_list, one per file, sent to
+    # workers instead of FuncDefs and their graphs
+    @staticmethod
+    def get_batches(func_list):
+        batches = {}
+        for key, func_def in func_list:
+            batches.setdefault(key[0], []).append((key, func_def.node))
+        return list(batches.values())
+
+    def make_executor(self):
+        summaries = [x.to_summary()
+                     for x in self.type_inferrer.user_types.values()]
+        initargs = (summaries, type(self.type_inferrer),
+                    self.type_inferrer.narrow_seeds)
+        return ProcessPoolExecutor(self.jobs,
+                                   initializer=init_analysis_worker,
+                                   initargs=initargs)
+
+    # Results of func over iterables in jobs worker processes, in order
+    def map_workers(self, func, *iterables, chunksize=1):
+        if self.executor is not None:
+            yield from self.executor.map(func, *iterables,
+                                         chunksize=chunksize)
+            return
+        with self.make_executor() as executor:
+            yield from executor.map(func, *iterables, chunksize=chunksize)
+
+    # {arg_key: [TypeDef]} of {arg_key: [class name]}
+    def get_types(self, arg_type_names):
+        user_types = self.type_inferrer.user_types
+        return {arg_key: [callsite.get_typedef(user_types, name)
+                          for name in names]
+                for arg_key, names in arg_type_names.items()}
+
+    # Functions are lifted in this process, callees first, and all of them
+    # are matched at once. Summaries are cached instead of per-function
+    # results.
+    def analyze_interprocedural(self, file_infos) -> AnalysisResult:
+        result = AnalysisResult(file_infos)
+        all_func_list = list(
+            chain(*map(AnalysisResult.get_func_defs, file_infos)))
+        summaries = summary.Summaries(summary.CallGraph(all_func_list),
+                                      self.summary_cache_path)
+        all_seeds = list(map(self.get_seeds, self.get_all_seed_names(
+            file_infos, all_func_list)))
+        if self.type_inferrer.overrides_infer_table():
+            all_inferred_types = self.type_inferrer.infer_tables(
+                (summaries.get_table(key) for key, _ in all_func_list),
+                all_seeds)
+        else:
+            all_inferred_types = self.type_inferrer.match_lifted_attrs(
+                [summaries.lifted_attrs[key] for key, _ in all_func_list],
+                all_seeds)
+        for (key, _), inferred_types in zip(all_func_list,
+                                            all_inferred_types):
+            result[key] = inferred_types
+        self.lifted_count = summaries.computed_count
+        self.matched_count = len(all_func_list)
+        return result
+
+    # Files already parsed here, by static preanalysis or for call_sites,
+    # have their functions sent to the workers, the others their paths, so
+    # that no file is parsed twice
+    def analyze_parallel(self, file_infos) -> AnalysisResult:
+        result = AnalysisResult(file_infos)
+        paths = [file_info.path for file_info in file_infos]
+        # (key, FuncDef) of the functions of each parsed file, else None
+        file_func_lists = {
+            file_info.path: AnalysisResult.get_func_defs(file_info)
+            if self.call_sites or self.source_store.is_parsed(file_info.path)
+            else None
+            for file_info in file_infos
+        }
+        # {key: seed names} of the functions of each file
+        file_seed_names = {path: {} for path in paths}
+        if self.call_sites:
+            all_func_list = list(chain(*file_func_lists.values()))
+            for (key, _), seed_names in zip(
+                    all_func_list,
+                    self.get_all_seed_names(file_infos, all_func_list)):
+                file_seed_names[key[0]][key] = seed_names
+        all_func_nodes = [
+            None if file_func_lists[path] is None else
+            [(key, func_def.node) for key, func_def in file_func_lists[path]]
+            for path in paths
+        ]
+        chunksize = max(1, len(paths) // (self.jobs * 4))
+        # Parsing, CFG build, fixpoint and matching of workers are timed
+        # as one phase
+        with profiler.phase('analysis workers'):
+            for file_result in self.map_workers(
+                    analyze_file, paths, all_func_nodes,
+                    [file_seed_names[path] for path in paths],
+                    chunksize=chunksize):
+                for key, arg_type_names in file_result:
+                    result[key] = self.get_types(arg_type_names)
+        self.lifted_count = self.matched_count = len(result.arg_types)
+        return result
+
+
+# TypeInferrer of a worker process, built once from TypeDef summaries
+worker_type_inferrer = None
+
+
+def init_analysis_worker(summaries, type_inferrer_class, narrow_seeds):
+    global worker_type_inferrer
+    user_types = preanalysis.from_summaries(summaries)
+    worker_type_inferrer = type_inferrer_class(None, user_types,
+                                               narrow_seeds=narrow_seeds)
+
+
+# Runs in a worker process: returns [(key, {arg_key: [class_name]})] of
+# func_defs, [(key, FuncDef)]. seed_names has the seed names of functions by
+# key.
+def infer_functions(func_defs, seed_names):
+    user_types = worker_type_inferrer.user_types
+    all_seeds = [{
+        arg_key: [callsite.get_typedef(user_types, x) for x in names]
+        for arg_key, names in seed_names.get(key, {}).items()
+    } for key, _ in func_defs]
+    all_inferred_types = worker_type_inferrer.infer_many(
+        [func_def for _, func_def in func_defs], all_seeds)
+    file_result = []
+    for (key, _), inferred_types in zip(func_defs, all_inferred_types):
+        arg_type_names = {
+            arg_key: [x.class_name for x in types]
+            for arg_key, types in inferred_types.items()
+        }
+        file_result.append((key, arg_type_names))
+    return file_result
+
+
+# The file of script_path is parsed here if func_nodes is None
+def analyze_file(script_path, func_nodes, seed_names):
+    if func_nodes is None:
+        return infer_functions(
+            AnalysisResult.get_func_defs(FileInfo(script_path)), seed_names)
+    return analyze_functions(func_nodes, seed_names)
+
+
+# func_nodes has the (key, ast.FunctionDef) of functions parsed by the parent
+def analyze_functions(func_nodes, seed_names):
+    return infer_functions([(key, FuncDef(node)) for key, node in func_nodes],
+                           seed_names)
+
+
+# Runs in a worker process: returns [(key, {arg_key: attribute names})] of
+# func_nodes
+def lift_functions(func_nodes):
+    return [(key, worker_type_inferrer.get_lifted_attrs(FuncDef(node)))
+            for key, node in func_nodes]
@@ -1,14 +1,15 @@
 import ast
-from copy import deepcopy
 from typing import List
 import shutil
 from pathlib import Path
-from . import analysis
+from . import analysis, profiler, source
 
 
 class NodeAnnotator(ast.NodeTransformer):
-    def __init__(self, analyzed_file: analysis.FileInfo):
-        self.analyzed_file = analyzed_file
+    def __init__(self, file_info: analysis.FileInfo,
+                 result: analysis.AnalysisResult):
+        self.file_info = file_info
+        self.result = result
 
     @staticmethod
     def create_union(ids: List[str]):
@@ -19,20 +20,14 @@ class NodeAnnotator(ast.NodeTransformer):
         return subscript
 
     def annotate_FunctionDef(self, node, class_name=None):
-        if class_name is None:
-            func_defs = self.analyzed_file.func_defs
-        else:
-            class_def = self.analyzed_file.class_defs[class_name]
-            func_defs = class_def.func_defs
-        func_def = func_defs.get(node.name, None)
-        if func_def is None:
-            return node
+        key = self.result.make_key(self.file_info, class_name, node.name)
+        arg_types = self.result[key]
         for arg in node.args.args:
-            inferred_types = func_def.arg_types.get(arg.arg, None)
+            inferred_types = arg_types.get(arg.arg, None)
             if not inferred_types:
                 continue
             inferred_type_names = list(
-                map(lambda x: x.class_.__name__, inferred_types))
+                map(lambda x: x.name, inferred_types))
             annotation = self.create_union(inferred_type_names)
             if annotation:
                 arg.annotation = annotation
@@ -63,21 +58,30 @@ class NodeAnnotator(ast.NodeTransformer):
 
 class Annotator:
     @staticmethod
-    def annotate(analyzed_file):
-        tree = deepcopy(analyzed_file.tree)
-        node_annotator = NodeAnnotator(analyzed_file)
+    def annotate(file_info, result, source_store=None):
+        if source_store is None:
+            source_store = source.SourceStore()
+        # NodeAnnotator mutates the tree, which is shared with other stages
+        tree = source_store.copy_tree(file_info.tree)
+        node_annotator = NodeAnnotator(file_info, result)
         tree = node_annotator.visit(tree)
         return tree
 
     @staticmethod
-    def annotate_dir(dir_path, analyzed_files):
+    def annotate_dir(dir_path, result, source_store=None):
+        with profiler.phase('annotation'):
+            Annotator.write_annotated_dir(dir_path, result, source_store)
+
+    @staticmethod
+    def write_annotated_dir(dir_path, result, source_store):
         dir_path = Path(dir_path)
         new_dir_path = Path(f"{str(dir_path)}.annotated")
         shutil.copytree(dir_path, new_dir_path, dirs_exist_ok=True)
-        for analyzed_file in analyzed_files:
-            relative_path = analyzed_file.path.relative_to(dir_path)
+        for file_info in result.file_infos:
+            relative_path = file_info.path.relative_to(dir_path)
             annoatated_path = new_dir_path / relative_path
-            annotated_code = ast.unparse(Annotator.annotate(analyzed_file))
+            annotated_code = ast.unparse(
+                Annotator.annotate(file_info, result, source_store))
             annoatated_path.write_text(annotated_code)
 
 
@@ -0,0 +1,55 @@
+import hashlib
+import json
+import sys
+from pathlib import Path
+
+# Bumped whenever cached analysis results change, dropping older stores
+VERSION = 2
+
+
+def hash_file(path):
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+
+# JSON store of per-file entries. An entry records the content hashes of the
+# files it was derived from and is only returned while all of them match.
+# The whole store is dropped when the Python version or VERSION changes.
+class FileCache:
+    def __init__(self, cache_path):
+        self.cache_path = Path(cache_path)
+        self.entries = {}
+        self.used = set()
+        if not self.cache_path.exists():
+            return
+        try:
+            data = json.loads(self.cache_path.read_text())
+        except ValueError:  # Corrupted cache is ignored
+            return
+        if data.get('python_version') == sys.version and \
+                data.get('version') == VERSION:
+            self.entries = data.get('entries', {})
+
+    def get(self, key, hashes):
+        entry = self.entries.get(key, None)
+        if entry is None:
+            return None
+        for path, hash_ in entry['hashes'].items():
+            if hashes.get(path, None) != hash_:
+                return None
+        self.used.add(key)
+        return entry['value']
+
+    def set(self, key, hashes, value):
+        self.entries[key] = {'hashes': hashes, 'value': value}
+        self.used.add(key)
+
+    # Entries not used since loading are stale and are not written back
+    def save(self):
+        entries = {key: self.entries[key] for key in self.used}
+        data = {
+            'python_version': sys.version,
+            'version': VERSION,
+            'entries': entries
+        }
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        self.cache_path.write_text(json.dumps(data))
@@ -0,0 +1,195 @@
+import ast
+from . import cache, preanalysis, profiler, summary
+
+# Builtin classes a literal or a call of their name is evidence of
+builtin_types = {
+    x.__name__: x for x in (int, float, complex, str, bytes, bool, list,
+                            dict, set, frozenset, tuple, type(None))
+}
+literal_types = {
+    ast.List: list, ast.ListComp: list, ast.Tuple: tuple, ast.Dict: dict,
+    ast.DictComp: dict, ast.Set: set, ast.SetComp: set, ast.JoinedStr: str
+}
+builtin_typedefs = {}
+
+
+# TypeDef of a user type name, or of a builtin class name made by
+# preanalysis.TypeDef.make_class_name
+def get_typedef(user_types, class_name):
+    if class_name in user_types:
+        return user_types[class_name]
+    if class_name not in builtin_typedefs:
+        name = class_name[len('builtins.'):]
+        builtin_typedefs[class_name] = preanalysis.TypeDef(
+            builtin_types[name])
+    return builtin_typedefs[class_name]
+
+
+# Evidence of the class of an argument: the class name of a literal, the
+# called name of a call, which may be a constructor, or None
+def get_evidence(arg):
+    if isinstance(arg, ast.Constant):
+        type_ = type(arg.value)
+        if type_.__name__ in builtin_types:
+            return preanalysis.TypeDef.make_class_name('builtins',
+                                                       type_.__name__)
+        return None
+    if type(arg) in literal_types:
+        return preanalysis.TypeDef.make_class_name(
+            'builtins', literal_types[type(arg)].__name__)
+    if isinstance(arg, ast.Call) and isinstance(arg.func, ast.Name):
+        return arg.func.id
+    return None
+
+
+# [name, class name for self.name calls or None, [evidence of positional
+# arguments], {keyword: evidence}] of a call, or None if it calls neither a
+# name nor a method of self_name
+def get_call_site(call, class_name, self_name):
+    func = call.func
+    if isinstance(func, ast.Name):
+        name, class_name = func.id, None
+    elif self_name is not None and isinstance(func, ast.Attribute) and \
+            isinstance(func.value, ast.Name) and func.value.id == self_name:
+        name = func.attr
+    else:
+        return None
+    args = []
+    for arg in call.args:
+        if isinstance(arg, ast.Starred):
+            break
+        args.append(get_evidence(arg))
+    keywords = {x.arg: get_evidence(x.value)
+                for x in call.keywords if x.arg is not None}
+    return [name, class_name, args, keywords]
+
+
+# Calls of a module by called name, before names are resolved, as JSON
+# serializable lists. self.name calls are only told apart in methods of
+# top-level classes, not in functions nested in them, the first parameter
+# of a method but a static method naming self.
+class CallSiteVisitor(ast.NodeVisitor):
+    def __init__(self):
+        self.call_sites = []
+        self.class_name = None
+        # Name of the first parameter of the enclosing method
+        self.self_name = None
+
+    def visit_ClassDef(self, node):
+        outer = self.class_name, self.self_name
+        self.class_name, self.self_name = node.name, None
+        self.generic_visit(node)
+        self.class_name, self.self_name = outer
+
+    def visit_FunctionDef(self, node):
+        outer = self.class_name, self.self_name
+        if self.class_name is not None and self.self_name is None and \
+                node.args.args and \
+                not summary.CallGraph.is_staticmethod(node):
+            self.self_name = node.args.args[0].arg
+        else:
+            self.class_name = self.self_name = None
+        self.generic_visit(node)
+        self.class_name, self.self_name = outer
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Call(self, node):
+        self.generic_visit(node)
+        call_site = get_call_site(node, self.class_name, self.self_name)
+        if call_site is not None:
+            self.call_sites.append(call_site)
+
+
+# Call sites of the functions of func_list, keyed as in AnalysisResult,
+# found in one pass over the tree of each FileInfo and resolved as by
+# summary.CallGraph. Constructor calls resolve to user types of the same
+# module, else to the one user type of that name. With cache_path, the call
+# sites of each file are stored until its content changes. Evidence is kept
+# instead of argument expressions, so the entry of a file is a few short
+# lists.
+class CallSiteIndex:
+    def __init__(self, dir_path, file_infos, func_list, user_types,
+                 cache_path=None):
+        self.dir_path = dir_path
+        self.user_types = user_types
+        self.func_defs = dict(func_list)
+        self.file_names, self.project_names = \
+            summary.CallGraph.get_names(self.func_defs)
+        class_names = {}
+        for user_type in user_types.values():
+            class_names.setdefault(user_type.name, []).append(
+                user_type.class_name)
+        self.project_class_names = {name: names[0]
+                                    for name, names in class_names.items()
+                                    if len(names) == 1}
+        # {key: [{parameter name: evidence}]}, one dict per call site
+        self.call_sites = {}
+        call_site_cache = None
+        if cache_path is not None:
+            call_site_cache = cache.FileCache(cache_path)
+        with profiler.phase('call sites'):
+            for file_info in file_infos:
+                self.add_file(file_info, call_site_cache)
+        if call_site_cache is not None:
+            call_site_cache.save()
+
+    def add_file(self, file_info, call_site_cache):
+        path = file_info.path
+        call_sites = None
+        if call_site_cache is not None:
+            relative_path = path.relative_to(self.dir_path).as_posix()
+            hashes = {relative_path: cache.hash_file(path)}
+            call_sites = call_site_cache.get(relative_path, hashes)
+        if call_sites is None:
+            visitor = CallSiteVisitor()
+            visitor.visit(file_info.tree)
+            call_sites = visitor.call_sites
+            if call_site_cache is not None:
+                call_site_cache.set(relative_path, hashes, call_sites)
+        module_name = preanalysis.make_module_name(self.dir_path, path)
+        for name, class_name, args, keywords in call_sites:
+            if class_name is None:
+                callee = self.file_names.get(path, {}).get(
+                    name, self.project_names.get(name, None))
+            else:
+                callee = (path, class_name, name)
+            if callee not in self.func_defs:
+                continue
+            bound = summary.CallGraph.get_bound(callee,
+                                                self.func_defs[callee])
+            params = [x.arg for x in self.func_defs[callee].args.args][bound:]
+            evidence = dict(zip(params, args))
+            evidence.update((keyword, keywords[keyword])
+                            for keyword in params if keyword in keywords)
+            self.call_sites.setdefault(callee, []).append({
+                param: self.resolve(module_name, x)
+                for param, x in evidence.items()
+            })
+
+    # Class name evidence stands for, or None
+    def resolve(self, module_name, evidence):
+        if evidence is None or evidence.startswith('builtins.'):
+            return evidence
+        class_name = preanalysis.TypeDef.make_class_name(module_name,
+                                                         evidence)
+        if class_name in self.user_types:
+            return class_name
+        if evidence in self.project_class_names:
+            return self.project_class_names[evidence]
+        if evidence in builtin_types:
+            return preanalysis.TypeDef.make_class_name('builtins', evidence)
+        return None
+
+    # {parameter name: class names} of the parameters of key every call
+    # site passes an argument with evidence to
+    def get_seed_names(self, key):
+        call_sites = self.call_sites.get(key, [])
+        if not call_sites:
+            return {}
+        seed_names = {}
+        for arg in self.func_defs[key].args.args:
+            class_names = [x.get(arg.arg, None) for x in call_sites]
+            if None not in class_names:
+                seed_names[arg.arg] = sorted(set(class_names))
+        return seed_names
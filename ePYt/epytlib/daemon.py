@@ -0,0 +1,228 @@
+from collections import deque
+import json
+import multiprocessing
+from pathlib import Path
+import shutil
+import socket
+import socketserver
+import tempfile
+from time import perf_counter
+
+from . import analysis, preanalysis, source
+
+
+class LatencyStats:
+    def __init__(self, size=1000):
+        self.size = size
+        self.counts = {}
+        self.latencies = {}  # The last size latencies of each command
+
+    def add(self, command, seconds):
+        self.counts[command] = self.counts.get(command, 0) + 1
+        if command not in self.latencies:
+            self.latencies[command] = deque(maxlen=self.size)
+        self.latencies[command].append(seconds)
+
+    def get_stats(self):
+        stats = {}
+        for command, latencies in self.latencies.items():
+            latencies = sorted(latencies)
+            stats[command] = {
+                'count': self.counts[command],
+                'mean_ms': sum(latencies) / len(latencies) * 1000,
+                'p50_ms': latencies[len(latencies) // 2] * 1000,
+                'p95_ms': latencies[int(len(latencies) * 0.95)] * 1000,
+                'max_ms': latencies[-1] * 1000
+            }
+        return stats
+
+
+# Runs in a child process forked for each rebuild: sends ({resolved path:
+# (path, [record])} of every analyzed file, None) or (None, error) through
+# connection. The modules the Analyzer executes, the attribute names it
+# interns and the values it hash-conses go away with the process, so the
+# daemon does not grow with every rebuild nor keep stale project modules.
+def build_records(connection, dir_path, source_store, analyzer_options):
+    try:
+        analyzer = analysis.Analyzer(dir_path, source_store=source_store,
+                                     **analyzer_options)
+        records = {}
+        for file_info in analyzer.file_infos:
+            records[file_info.path.resolve()] = (str(file_info.path), [
+                analysis.AnalysisResult.make_record(key, analyzer.result[key])
+                for key, _ in analysis.AnalysisResult.get_func_defs(file_info)
+            ])
+        connection.send((records, None))
+    except Exception as e:
+        connection.send((None, f"{type(e).__name__}: {e}"))
+    finally:
+        connection.close()
+
+
+# Keeps analysis results warm between requests. Invalidated paths, or any
+# project file added, removed or changed on disk, make the next request
+# rebuild them; the rebuild runs in a forked child process sharing the
+# parsed trees of unchanged files and the on-disk caches of cache_dir, so
+# only changed modules are executed and changed functions analyzed.
+class AnalysisDaemon:
+    fork_context = multiprocessing.get_context('fork')
+
+    def __init__(self, dir_path, cache_dir=None, jobs=None, timeout=None,
+                 typedef_mode=preanalysis.DYNAMIC):
+        self.dir_path = Path(dir_path)
+        self.temp_cache_dir = None
+        if cache_dir is None:
+            cache_dir = self.temp_cache_dir = tempfile.mkdtemp()
+        self.analyzer_options = {
+            'cache_dir': cache_dir,
+            'jobs': jobs,
+            'timeout': timeout,
+            'typedef_mode': typedef_mode
+        }
+        self.source_store = source.SourceStore()
+        # {resolved path: (path, [record])}, None until built
+        self.records = None
+        # (mtime, size) of each project file the records were built from
+        self.file_stats = {}
+        self.stats = LatencyStats()
+        self.running = True
+        self.handlers = {
+            'infer_file': self.infer_file,
+            'infer_function': self.infer_function,
+            'invalidate': self.invalidate,
+            'stats': lambda request: self.stats.get_stats(),
+            'shutdown': self.shutdown
+        }
+
+    def get_file_stats(self):
+        file_stats = {}
+        for path in self.source_store.get_script_paths(self.dir_path):
+            stat = path.stat()
+            file_stats[path.resolve()] = (stat.st_mtime_ns, stat.st_size)
+        return file_stats
+
+    def get_records(self):
+        file_stats = self.get_file_stats()
+        if self.records is not None and file_stats == self.file_stats:
+            return self.records
+        # Parsed here, so that later rebuilds share the trees
+        for path in self.source_store.get_script_paths(self.dir_path):
+            self.source_store.get_tree(path)
+        receiver, sender = self.fork_context.Pipe(duplex=False)
+        process = self.fork_context.Process(
+            target=build_records,
+            args=(sender, self.dir_path, self.source_store,
+                  self.analyzer_options))
+        process.start()
+        sender.close()
+        try:
+            records, error = receiver.recv()
+        except EOFError:
+            records, error = None, "analysis process died"
+        finally:
+            receiver.close()
+            process.join()
+        if error is not None:
+            raise RuntimeError(error)
+        self.records, self.file_stats = records, file_stats
+        return self.records
+
+    def get_file_records(self, path):
+        path = Path(path).resolve()
+        records = self.get_records()
+        if path not in records:
+            raise KeyError(f"{path} is not analyzed")
+        return records[path]
+
+    def infer_file(self, request):
+        path, functions = self.get_file_records(request['path'])
+        return {'path': path, 'functions': functions}
+
+    def infer_function(self, request):
+        _, functions = self.get_file_records(request['path'])
+        for function in functions:
+            if function['function'] == request['function'] and \
+                    function['class'] == request.get('class', None):
+                return function
+        raise KeyError(f"No function {request['function']} in "
+                       f"{request['path']}")
+
+    def invalidate(self, request):
+        for path in request.get('paths', []):
+            self.source_store.evict(path)
+        self.records = None
+        return None
+
+    def shutdown(self, request):
+        self.running = False
+        return None
+
+    # Returns {'ok': True, 'result': ...} or {'ok': False, 'error': ...}
+    def handle(self, request):
+        start = perf_counter()
+        command = request.get('command', None)
+        try:
+            if command not in self.handlers:
+                raise ValueError(f"Unknown command {command}")
+            response = {'ok': True, 'result': self.handlers[command](request)}
+        except Exception as e:
+            response = {'ok': False, 'error': f"{type(e).__name__}: {e}"}
+        self.stats.add(command, perf_counter() - start)
+        return response
+
+    def close(self):
+        if self.temp_cache_dir is not None:
+            shutil.rmtree(self.temp_cache_dir, ignore_errors=True)
+
+
+# One JSON request per line, answered by one JSON response per line
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                response = {'ok': False, 'error': f"ValueError: {e}"}
+            else:
+                response = self.server.analysis_daemon.handle(request)
+            self.wfile.write(json.dumps(response).encode() + b'\n')
+            self.wfile.flush()
+            if not self.server.analysis_daemon.running:
+                return
+
+
+# address is a Unix socket path (str) or a localhost TCP port (int)
+def make_server(daemon, address):
+    if isinstance(address, int):
+        server = socketserver.TCPServer(('127.0.0.1', address), RequestHandler)
+    else:
+        Path(address).unlink(missing_ok=True)
+        server = socketserver.UnixStreamServer(address, RequestHandler)
+    server.analysis_daemon = daemon
+    return server
+
+
+def serve(daemon, address):
+    with make_server(daemon, address) as server:
+        try:
+            daemon.get_records()
+            while daemon.running:
+                server.handle_request()
+        finally:
+            daemon.close()
+            if not isinstance(address, int):
+                Path(address).unlink(missing_ok=True)
+
+
+def send_request(address, request):
+    if isinstance(address, int):
+        client = socket.create_connection(('127.0.0.1', address))
+    else:
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.connect(address)
+    with client, client.makefile('rwb') as stream:
+        stream.write(json.dumps(request).encode() + b'\n')
+        stream.flush()
+        return json.loads(stream.readline())
@@ -1,18 +1,143 @@
-from copy import deepcopy
+from collections import OrderedDict
+from copy import copy, deepcopy
+from weakref import KeyedRef
 from . import preanalysis
 
+# Global interning table of attribute names. An attribute set is an int whose
+# n-th bit is set when it contains attr_names[n].
+attr_names = []
+attr_ids = {}
+
+
+def intern_attr(name):
+    attr_id = attr_ids.get(name)
+    if attr_id is None:
+        attr_id = attr_ids[name] = len(attr_names)
+        attr_names.append(name)
+    return attr_id
+
+
+def to_bits(names):
+    bits = 0
+    for name in names:
+        bits |= 1 << intern_attr(name)
+    return bits
+
+
+def from_bits(bits):
+    names = []
+    while bits:
+        low_bit = bits & -bits
+        names.append(attr_names[low_bit.bit_length() - 1])
+        bits ^= low_bit
+    return names
+
+
+# Hash-consing of HasAttr and FixedType values: one shared instance per
+# class and attribute bits, so equal shared values are identical. Joins and
+# meets of shared values are cached in a bounded LRU keyed by operands.
+# A shared value is only kept while referenced, by a memory or the LRU, so
+# the table does not outgrow the analysis. Shared values are immutable,
+# adding attributes to them raises TypeError.
+class ValueTable:
+    hash_consed_types = ()  # Set once HasAttr and FixedType are defined
+
+    def __init__(self, cache_size=1 << 14):
+        # {(class, property bits, method bits): KeyedRef of the value}, as
+        # WeakValueDictionary but looked up without a Python level call
+        self.values = {}
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+        self.value_hits = 0
+        self.value_misses = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def make(self, cls, property_bits, method_bits):
+        key = (cls, property_bits, method_bits)
+        ref = self.values.get(key, None)
+        if ref is not None:
+            value = ref()
+            if value is not None:
+                self.value_hits += 1
+                return value
+        self.value_misses += 1
+        value = object.__new__(cls)
+        value.property_bits = property_bits
+        value.method_bits = method_bits
+        value.hash_consed = True
+        self.values[key] = KeyedRef(value, self.remove, key)
+        return value
+
+    # Called when a shared value is collected
+    def remove(self, ref):
+        if self.values.get(ref.key, None) is ref:
+            del self.values[ref.key]
+
+    # The shared instance equal to value, or value if it cannot be shared
+    def hash_cons(self, value):
+        if value.hash_consed or type(value) not in self.hash_consed_types:
+            return value
+        return self.make(type(value), value.property_bits, value.method_bits)
+
+    # Entries keep their operands alive, so the ids in a key are not reused
+    # while it is cached
+    def apply(self, operation, a, b):
+        key = (operation, id(a), id(b))
+        entry = self.cache.get(key, None)
+        if entry is not None:
+            self.cache_hits += 1
+            self.cache.move_to_end(key)
+            return entry[2]
+        self.cache_misses += 1
+        result = getattr(a, operation + '_values')(b)
+        self.cache[key] = (a, b, result)
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return result
+
+    @staticmethod
+    def get_rate(hits, misses):
+        return hits / (hits + misses) if hits + misses else 0.0
+
+    def get_stats(self):
+        return {
+            'values': len(self.values),
+            'value_hits': self.value_hits,
+            'value_misses': self.value_misses,
+            'value_hit_rate': self.get_rate(self.value_hits,
+                                            self.value_misses),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'cache_hit_rate': self.get_rate(self.cache_hits,
+                                            self.cache_misses)
+        }
+
+
+value_table = ValueTable()
+
 
 class BaseType:
+    # Whether this is the shared instance of its value
+    hash_consed = False
+
     @staticmethod
     def _join(a, b):
-        new_type = deepcopy(a)
-        new_type.properties.extend(b.properties)
-        new_type.methods.extend(b.methods)
-        new_type.properties = list(set(new_type.properties))
-        new_type.methods = list(set(new_type.methods))
+        if type(a) in value_table.hash_consed_types:
+            return value_table.make(type(a),
+                                    a.property_bits | b.property_bits,
+                                    a.method_bits | b.method_bits)
+        new_type = copy(a)
+        new_type.property_bits |= b.property_bits
+        new_type.method_bits |= b.method_bits
         return new_type
 
     def join(self, other):
+        if self.hash_consed and other.hash_consed:
+            return value_table.apply('join', self, other)
+        return self.join_values(other)
+
+    def join_values(self, other):
         if isinstance(self, FixedType):
             return self
         if isinstance(other, FixedType):
@@ -23,15 +148,40 @@ class BaseType:
             return AnyType()
         return self._join(self, other)
 
+    # Join with the previous value of a node that jumps up to limit, a bound
+    # of every value the chain can reach, as soon as self adds something.
+    # A chain is thus widened at most once.
+    def widen(self, previous, limit):
+        joined = self.join(previous)
+        if limit is None or not isinstance(joined, HasAttr) or \
+                isinstance(joined, FixedType) or \
+                isinstance(previous, HasAttr) and joined <= previous:
+            return joined
+        return self._join(joined, limit)
+
     def meet(self, other):
+        if self.hash_consed and other.hash_consed:
+            return value_table.apply('meet', self, other)
+        return self.meet_values(other)
+
+    def meet_values(self, other):
         if isinstance(self, AnyType):
-            return deepcopy(other)
+            return other if other.hash_consed else deepcopy(other)
         if isinstance(other, AnyType):
-            return deepcopy(self)
+            return self if self.hash_consed else deepcopy(self)
         return self._join(self, other)
 
 
+# A single shared instance
 class AnyType(BaseType):
+    hash_consed = True
+    instance = None
+
+    def __new__(cls):
+        if cls.instance is None:
+            cls.instance = super().__new__(cls)
+        return cls.instance
+
     def __str__(self):
         return "AnyType"
 
@@ -40,19 +190,50 @@ class AnyType(BaseType):
 
 
 class HasAttr(BaseType):
-    def __init__(self):
-        self.properties = list()
-        self.methods = list()
+    def __init__(self, properties=(), methods=()):
+        self.property_bits = to_bits(properties)
+        self.method_bits = to_bits(methods)
+
+    # The shared instance with these attribute bits
+    @classmethod
+    def make(cls, property_bits=0, method_bits=0):
+        return value_table.make(cls, property_bits, method_bits)
+
+    @property
+    def properties(self):
+        return from_bits(self.property_bits)
+
+    @property
+    def methods(self):
+        return from_bits(self.method_bits)
 
     @property
     def attributes(self):
         return self.methods + self.properties
 
+    @property
+    def attribute_bits(self):
+        return self.method_bits | self.property_bits
+
+    def check_mutable(self):
+        if self.hash_consed:
+            raise TypeError(f"{self!r} is shared and immutable")
+
+    def add_property(self, prop: str):
+        self.check_mutable()
+        self.property_bits |= 1 << intern_attr(prop)
+
+    def add_method(self, method: str):
+        self.check_mutable()
+        self.method_bits |= 1 << intern_attr(method)
+
     def has_property(self, prop: str):
-        return prop in self.properties
+        return bool(prop in attr_ids and
+                    self.property_bits >> attr_ids[prop] & 1)
 
     def has_method(self, method: str):
-        return method in self.methods
+        return bool(method in attr_ids and
+                    self.method_bits >> attr_ids[method] & 1)
 
     def __str__(self):
         return "HasAttr of " + \
@@ -65,15 +246,19 @@ class HasAttr(BaseType):
         return f'<{str(self)}>'
 
     def __le__(self, other: 'HasAttr'):
-        return self.properties <= other.properties and \
-               self.methods <= other.methods
+        return not (self.property_bits & ~other.property_bits or
+                    self.method_bits & ~other.method_bits)
 
     def __ge__(self, other: 'HasAttr'):
         return other <= self
 
     def __eq__(self, other: 'HasAttr'):
-        return self.properties == other.properties and \
-               self.methods == other.methods
+        if self is other:
+            return True
+        if not isinstance(other, HasAttr):
+            return NotImplemented
+        return self.property_bits == other.property_bits and \
+               self.method_bits == other.method_bits
 
     def __ne__(self, other: 'HasAttr'):
         return not self == other
@@ -83,8 +268,8 @@ class Typed(HasAttr):
     def __init__(self, typedef: preanalysis.TypeDef):
         super().__init__()
         self.typedef = typedef
-        self.properties.extend(typedef.type.properties)
-        self.methods.extend(typedef.type.methods)
+        self.property_bits = typedef.type.property_bits
+        self.method_bits = typedef.type.method_bits
 
     def __str__(self):
         return f"Typed type [{self.typedef.class_name}] {super().__str__()}"
@@ -94,13 +279,16 @@ class FixedType(HasAttr):
     def __init__(self, has_attr):
         super().__init__()
         if isinstance(has_attr, HasAttr):
-            self.properties.extend(has_attr.properties)
-            self.methods.extend(has_attr.methods)
+            self.property_bits = has_attr.property_bits
+            self.method_bits = has_attr.method_bits
 
     def __str__(self):
         return f"Fixed type {super().__str__()}"
 
 
+ValueTable.hash_consed_types = (HasAttr, FixedType)
+
+
 class AnnotatedType(BaseType):
     def __init__(self, str_type):
         self.strType = str_type
@@ -1,5 +1,7 @@
 import ast
+from array import array
 from pathlib import Path
+from . import profiler, table
 
 
 class Node:
@@ -81,7 +83,12 @@ class Graph(ast.NodeVisitor):
         self.nodes = []
         self.current_prev = []
         self.func_defs = {}
-        self.parse(stmts)
+        with profiler.phase('cfg build'):
+            self.parse(stmts)
+        prof = profiler.current
+        if prof is not None:
+            prof.count('graph.graphs')
+            prof.count('graph.nodes', len(self.nodes))
 
     def parse(self, stmts):
         for stmt in stmts:
@@ -92,6 +99,53 @@ class Graph(ast.NodeVisitor):
                 self.nodes.append(node)
                 self.current_prev = [node]
 
+    def get_preds(self):
+        return {node: node.prev for node in self.nodes}
+
+    # Statements of a node and whether Semantic lifts facts from them
+    @staticmethod
+    def get_stmts(node):
+        return node.instr_list, isinstance(node, (Atomic, Branch))
+
+    def make_table(self, initial_memory):
+        return table.Table(self.nodes, initial_memory)
+
+    def to_compact(self):
+        return CompactGraph(self)
+
+    def get_succs(self):
+        succs = {node: [] for node in self.nodes}
+        for node in self.nodes:
+            for prev in node.prev:
+                succs[prev].append(node)
+        return succs
+
+    # Reverse postorder over successor edges, starting from nodes without prev
+    def reverse_postorder(self, succs=None):
+        if succs is None:
+            succs = self.get_succs()
+        visited = set()
+        postorder = []
+        for root in self.nodes:
+            if root.prev or root in visited:
+                continue
+            visited.add(root)
+            stack = [(root, iter(succs[root]))]
+            while stack:
+                node, children = stack[-1]
+                for child in children:
+                    if child not in visited:
+                        visited.add(child)
+                        stack.append((child, iter(succs[child])))
+                        break
+                else:
+                    stack.pop()
+                    postorder.append(node)
+        # Nodes only reachable through cycles are appended in source order
+        postorder.reverse()
+        postorder.extend(filter(lambda x: x not in visited, self.nodes))
+        return postorder
+
     def make_branch(self, node, nt: Branch):
         nf = nt.fork()
         self.nodes.extend([nt, nf])
@@ -114,12 +168,25 @@ class Graph(ast.NodeVisitor):
         self.parse(node.body)
         self.current_prev = current_prev_backup
 
+    # Both branches of a loop header share its prev, to which the exits of
+    # the body are added as back-edges. The loop is left through the false
+    # branch, followed by the else clause.
+    def make_loop(self, node, nt: Branch):
+        nf = nt.fork()
+        self.nodes.extend([nt, nf])
+        self.current_prev = [nt]
+        self.parse(node.body)
+        nt.prev.extend(self.current_prev)
+        self.current_prev = [nf]
+        self.parse(node.orelse)
+
     def visit_For(self, node: ast.For):
-        self.make_branch(node, Branch(True, [node.target, node.iter],
-                                      self.current_prev))
+        self.make_loop(node, Branch(True, [node.target, node.iter],
+                                    list(self.current_prev)))
 
     def visit_While(self, node: ast.While):
-        self.make_branch(node, Branch(True, [node.test], self.current_prev))
+        self.make_loop(node, Branch(True, [node.test],
+                                    list(self.current_prev)))
 
     #
     # def visit_Try(self, node):
@@ -142,6 +209,110 @@ class Graph(ast.NodeVisitor):
     #     return node
 
 
+# Adjacency lists in CSR form: the targets of node i are
+# targets[offsets[i]:offsets[i + 1]]
+class Adjacency:
+    def __init__(self, offsets, targets):
+        self.offsets = offsets
+        self.targets = targets
+
+    def __getitem__(self, index):
+        return self.targets[self.offsets[index]:self.offsets[index + 1]]
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    # Adjacency lists as a list of tuples, faster to index while running
+    def unpack(self):
+        offsets, targets = self.offsets, self.targets
+        return [tuple(targets[offsets[i]:offsets[i + 1]])
+                for i in range(len(offsets) - 1)]
+
+
+# Graph with integer node IDs, numbered in the order of Graph.nodes.
+# Predecessors and successors are CSR arrays and statements are kept in a
+# side table of references, so the two nodes of a branch share one list.
+# Semantic runs on it with ArrayTable storage, indexed by node ID.
+class CompactGraph:
+    ATOMIC = 0
+    BRANCH_TRUE = 1
+    BRANCH_FALSE = 2
+    FUNC_DEF = 3
+
+    def __init__(self, graph_: Graph):
+        ids = {node: index for index, node in enumerate(graph_.nodes)}
+        self.nodes = range(len(ids))
+        self.kinds = bytearray(map(self.get_kind, graph_.nodes))
+        self.stmts = [node.instr_list for node in graph_.nodes]
+        self.func_defs = {name: ids[node]
+                          for name, node in graph_.func_defs.items()}
+        pred_offsets = array('i', [0])
+        preds = array('i')
+        succ_counts = [0] * len(ids)
+        for node in graph_.nodes:
+            for prev in node.prev:
+                preds.append(ids[prev])
+                succ_counts[ids[prev]] += 1
+            pred_offsets.append(len(preds))
+        succ_offsets = array('i', [0])
+        for count in succ_counts:
+            succ_offsets.append(succ_offsets[-1] + count)
+        succs = array('i', bytes(4 * len(preds)))
+        fill = array('i', succ_offsets[:-1])
+        for index in self.nodes:
+            for prev in preds[pred_offsets[index]:pred_offsets[index + 1]]:
+                succs[fill[prev]] = index
+                fill[prev] += 1
+        self.preds = Adjacency(pred_offsets, preds)
+        self.succs = Adjacency(succ_offsets, succs)
+
+    @classmethod
+    def get_kind(cls, node):
+        if isinstance(node, Branch):
+            return cls.BRANCH_TRUE if node.truth else cls.BRANCH_FALSE
+        if isinstance(node, FuncDefNode):
+            return cls.FUNC_DEF
+        return cls.ATOMIC
+
+    def get_preds(self):
+        return self.preds.unpack()
+
+    def get_succs(self):
+        return self.succs.unpack()
+
+    def get_stmts(self, index):
+        return self.stmts[index], self.kinds[index] != self.FUNC_DEF
+
+    def make_table(self, initial_memory):
+        return table.ArrayTable(len(self.nodes), initial_memory)
+
+    # Same order as Graph.reverse_postorder, as node IDs
+    def reverse_postorder(self, succs=None):
+        if succs is None:
+            succs = self.get_succs()
+        pred_offsets = self.preds.offsets
+        visited = bytearray(len(self.nodes))
+        postorder = []
+        for root in self.nodes:
+            if pred_offsets[root] != pred_offsets[root + 1] or visited[root]:
+                continue
+            visited[root] = True
+            stack = [(root, iter(succs[root]))]
+            while stack:
+                node, children = stack[-1]
+                for child in children:
+                    if not visited[child]:
+                        visited[child] = True
+                        stack.append((child, iter(succs[child])))
+                        break
+                else:
+                    stack.pop()
+                    postorder.append(node)
+        postorder.reverse()
+        postorder.extend(x for x in self.nodes if not visited[x])
+        return postorder
+
+
 # Debugging function
 def parse_from_file(script_path):
     script_path = Path(script_path)
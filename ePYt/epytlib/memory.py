@@ -1,14 +1,14 @@
-from copy import deepcopy
-from itertools import chain
-from . import domain
+from . import domain, profiler
 
 
+# Memory is persistent: its dict is never mutated once built, and values are
+# never mutated once stored, so memories share both dicts and values freely.
 class Memory:
     def __init__(self, dict_default=None):
         if dict_default is None:
             self.memory = dict()
-        elif isinstance(dict_default, Memory):  # Deep copy
-            self.memory = deepcopy(dict_default.memory)
+        elif isinstance(dict_default, Memory):  # Shares dict and values
+            self.memory = dict_default.memory
         elif isinstance(dict_default, dict):  # Shallow copy
             self.memory = dict_default
         else:
@@ -25,38 +25,65 @@ class Memory:
 
     # Add (key, value) to memory
     def add(self, item):
-        new_mem = Memory(self)
+        prof = profiler.current
+        if prof is not None:
+            prof.count('memory.add')
         key, value = item
         if key in self.memory:
             # print(f"Joining {item} with existing:{self.memory[key]}")
-            new_mem.memory[key] = value.join(self.memory[key])
-        else:
-            new_mem.memory[key] = value
-        return new_mem
+            value = value.join(self.memory[key])
+        new_dict = dict(self.memory)
+        new_dict[key] = value
+        return Memory(new_dict)
 
     # Join with another memory
     def join(self, other):
-        joined_mem = Memory()
-        for key, value in chain(self.memory.items(), other.memory.items()):
-            if key in joined_mem:
-                joined_mem.memory[key] = value.join(joined_mem[key])
-            else:
-                joined_mem.memory[key] = deepcopy(value)
-        return joined_mem
+        prof = profiler.current
+        if prof is not None:
+            prof.count('memory.join')
+        if self.memory is other.memory or not other.memory:
+            return self
+        if not self.memory:
+            return other
+        joined_dict = dict(self.memory)
+        for key, value in other.memory.items():
+            if key not in joined_dict:
+                joined_dict[key] = value
+            elif joined_dict[key] is not value:
+                joined_dict[key] = value.join(joined_dict[key])
+        return Memory(joined_dict)
+
+    # Join with a later memory of the same node, widening each value with
+    # its limit in limits
+    def widen(self, other, limits):
+        if self.memory is other.memory or not other.memory:
+            return self
+        widened_dict = dict(self.memory)
+        for key, value in other.memory.items():
+            if key not in widened_dict:
+                widened_dict[key] = value
+            elif widened_dict[key] is not value:
+                widened_dict[key] = value.widen(widened_dict[key],
+                                                limits.get(key, None))
+        return Memory(widened_dict)
 
+    # Returns a new memory, as add and join may return self or other
     def fix(self, key):
         assert key in self.memory
         value = self.memory[key]
+        new_dict = dict(self.memory)
         if value.attributes:
-            self.memory[key] = domain.FixedType(value)
+            new_dict[key] = domain.FixedType.make(value.property_bits,
+                                                  value.method_bits)
         else:  # FixedType(AnyType) contains no information
-            del self.memory[key]
+            del new_dict[key]
+        return Memory(new_dict)
 
     def __eq__(self, other: 'Memory'):
-        return self.memory == other.memory
+        return self.memory is other.memory or self.memory == other.memory
 
     def __ne__(self, other: 'Memory'):
-        return self.memory != other.memory
+        return not self == other
 
     def __str__(self):
         return '\n'.join(map(lambda x: f"{x[0]} : {x[1]}", self.memory.items()))
@@ -1,11 +1,23 @@
 import ast
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
 from inspect import signature, getmembers, isclass, getmro
+import logging
+import multiprocessing
 from pathlib import Path
 from types import ModuleType
 from typing import Dict
+import signal
 import sys
+from time import perf_counter
 
-from . import domain
+from . import cache, domain, profiler, source
+
+logger = logging.getLogger(__name__)
+
+# Modes of get_typedefs
+DYNAMIC = 'dynamic'  # Execute target modules and inspect their classes
+STATIC = 'static'  # Only read the AST of target modules
 
 
 class TypeDef:
@@ -23,22 +35,53 @@ class TypeDef:
     def __init__(self, class_):
         self.class_ = class_
         self.module_name = class_.__module__
+        self.name = class_.__name__
         self.class_name = self.make_class_name(self.module_name,
                                                class_.__name__)
         self.type = domain.HasAttr()
         self.base_classes = tuple(
             filter(lambda x: x not in (class_, object), getmro(class_)))
+        self.base_class_names = tuple(
+            map(lambda x: self.make_class_name(x.__module__, x.__name__),
+                self.base_classes))
         self.base_class_types = []
         for key, value in getmembers(class_):
             if callable(value):
                 if hasattr(object, key) and value == getattr(object, key):
                     continue
                 # self.type.methods.append((key, self._get_signature(value)))
-                self.type.methods.append(key)
+                self.type.add_method(key)
             else:
-                self.type.properties.append(key)
+                self.type.add_property(key)
         self.init_properties = []
 
+    # Picklable and JSON serializable form, without live class objects
+    def to_summary(self):
+        return {
+            'module_name': self.module_name,
+            'name': self.name,
+            'properties': self.type.properties,
+            'methods': self.type.methods,
+            'base_class_names': list(self.base_class_names),
+            'init_properties': list(self.init_properties)
+        }
+
+    @classmethod
+    def from_summary(cls, summary):
+        typedef = cls.__new__(cls)
+        typedef.class_ = None
+        typedef.module_name = summary['module_name']
+        typedef.name = summary['name']
+        typedef.class_name = cls.make_class_name(typedef.module_name,
+                                                 typedef.name)
+        typedef.type = domain.HasAttr(summary['properties'],
+                                      summary['methods'])
+        typedef.base_classes = ()
+        typedef.base_class_names = tuple(summary['base_class_names'])
+        typedef.base_class_types = []
+        typedef.init_properties = list(summary['init_properties'])
+        return typedef
+
     def __str__(self):
         return "\n".join(
             map(str, [
@@ -127,65 +170,469 @@ def make_module_name(dir_path, src_path):
     return module_name
 
 
-def get_typedefs(script_dir_path) -> Dict[str, TypeDef]:
+def exec_module(script_dir_path, script_path, source_store):
+    module_name = make_module_name(script_dir_path, script_path)
+    tree = source_store.get_tree(script_path)
+    compiled = compile(tree, "name", "exec")
+    module = ModuleType(module_name)
+    module.__loader__ = __loader__
+    module.__file__ = str(script_path)
+    module.__builtins__ = __builtins__
+    gvars = module.__dict__
+    try:
+        with profiler.phase('module exec', module_name):
+            exec(compiled, gvars)
+    except SystemExit:
+        pass
+    return gvars
+
+
+def get_init_properties(tree):
+    methods_visitor = MethodsVisitor()
+    methods_visitor.visit(tree)
+    init_props_visitor = InitPropertiesVisitor(methods_visitor.methods)
+    init_props_visitor.visit(tree)
+    return init_props_visitor.init_properties
+
+
+# TypeDefs of the classes reachable from a module, with their base classes
+def get_module_typedefs(script_dir_path, script_path,
+                        source_store=None) -> Dict[str, TypeDef]:
+    if source_store is None:
+        source_store = source.SourceStore()
+    module_name = make_module_name(script_dir_path, script_path)
+    gvars = exec_module(script_dir_path, script_path, source_store)
+    class_types = {}
+    for class_ in filter(isclass, list(gvars.values())):
+        for mro_class in getmro(class_):
+            if mro_class is object:
+                continue
+            class_type = TypeDef(mro_class)
+            class_types.setdefault(class_type.class_name, class_type)
+    init_props = get_init_properties(source_store.get_tree(script_path))
+    for class_name, init_props in init_props.items():
+        name = TypeDef.make_class_name(module_name, class_name)
+        if name not in class_types:
+            continue
+        class_type = class_types[name]
+        class_type.init_properties = init_props
+        for init_prop in init_props:
+            class_type.type.add_property(init_prop)
+    return class_types
+
+
+# Resolve base_class_types by name and merge init properties of base classes
+def link_typedefs(class_types: Dict[str, TypeDef]):
+    for class_type in class_types.values():
+        class_type.base_class_types = [
+            class_types[name] for name in class_type.base_class_names
+            if name in class_types
+        ]
+    for class_type in class_types.values():
+        for base_class_type in class_type.base_class_types:
+            for base_class_init_prop in base_class_type.init_properties:
+                class_type.type.add_property(base_class_init_prop)
+    return class_types
+
+
+class StaticModuleVisitor(ast.NodeVisitor):
+    # Members getmembers reports on every class defined in Python
+    implicit_properties = ('__dict__', '__doc__', '__module__', '__weakref__')
+    implicit_methods = ('__init_subclass__', '__subclasshook__')
+
+    def __init__(self, module_name, import_name, is_package):
+        self.module_name = module_name
+        self.import_name = import_name
+        self.is_package = is_package
+        self.class_defs: Dict[str, ast.ClassDef] = {}
+        self.imports: Dict[str, str] = {}
+
+    @staticmethod
+    def is_property(func_def):
+        for decorator in func_def.decorator_list:
+            name = ast.unparse(decorator)
+            if name.endswith(('property', '.setter', '.getter', '.deleter')):
+                return True
+        return False
+
+    def get_members(self, class_def):
+        properties = list(self.implicit_properties)
+        methods = list(self.implicit_methods)
+        for body in class_def.body:
+            if isinstance(body, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                if self.is_property(body):
+                    properties.append(body.name)
+                else:
+                    methods.append(body.name)
+            elif isinstance(body, ast.Assign):
+                for target in body.targets:
+                    if isinstance(target, ast.Name):
+                        properties.append(target.id)
+            elif isinstance(body, ast.AnnAssign):
+                properties.append('__annotations__')
+                if body.value is not None and \
+                        isinstance(body.target, ast.Name):
+                    properties.append(body.target.id)
+        return properties, methods
+
+    def visit_ClassDef(self, node):
+        self.class_defs[node.name] = node
+
+    def visit_FunctionDef(self, node):
+        pass
+
+    def visit_AsyncFunctionDef(self, node):
+        pass
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            if alias.asname is None:
+                top_name = alias.name.split('.')[0]
+                self.imports[top_name] = top_name
+            else:
+                self.imports[alias.asname] = alias.name
+
+    def visit_ImportFrom(self, node):
+        from_name = node.module or ''
+        if node.level:
+            package = self.import_name
+            if not self.is_package:
+                package = package.rpartition('.')[0]
+            for _ in range(node.level - 1):
+                package = package.rpartition('.')[0]
+            from_name = package + ('.' + from_name if from_name else '')
+        for alias in node.names:
+            self.imports[alias.asname or alias.name] = \
+                f"{from_name}.{alias.name}"
+
+
+# Resolves class names across modules through module level imports, without
+# executing anything. Classes outside of the project resolve to their dotted
+# name.
+class StaticResolver:
+    def __init__(self, visitors: Dict[str, StaticModuleVisitor]):
+        self.visitors = visitors
+
+    def resolve_dotted(self, dotted_name, depth):
+        parts = dotted_name.split('.')
+        for index in range(len(parts) - 1, 0, -1):
+            import_name = '.'.join(parts[:index])
+            if import_name in self.visitors:
+                return self.resolve(import_name, '.'.join(parts[index:]),
+                                    depth + 1)
+        return dotted_name
+
+    def resolve(self, import_name, name, depth=0):
+        if depth > len(self.visitors):  # Cyclic imports
+            return None
+        visitor = self.visitors[import_name]
+        head, _, rest = name.partition('.')
+        if not rest and head in visitor.class_defs:
+            return TypeDef.make_class_name(visitor.module_name, head)
+        if head in visitor.imports:
+            target = visitor.imports[head]
+            return self.resolve_dotted(target + ('.' + rest if rest else ''),
+                                       depth)
+        return None
+
+
+# TypeDefs built from the AST only, for classes defined in the project.
+# Bases are resolved across files and members of project base classes are
+# inherited. Bases outside of the project contribute no members.
+def get_static_typedefs(script_dir_path,
+                        source_store=None) -> Dict[str, TypeDef]:
+    if source_store is None:
+        source_store = source.SourceStore()
     script_dir_path = Path(script_dir_path)
-    sys.path.append(str(script_dir_path.parent))
+    visitors: Dict[str, StaticModuleVisitor] = {}
+    init_properties = {}
+    for script_path in source_store.get_script_paths(script_dir_path):
+        module_name = make_module_name(script_dir_path, script_path)
+        is_package = script_path.name == '__init__.py'
+        import_name = module_name.rpartition('.')[0] if is_package \
+            else module_name
+        tree = source_store.get_tree(script_path)
+        visitor = StaticModuleVisitor(module_name, import_name, is_package)
+        visitor.visit(tree)
+        visitors[import_name] = visitor
+        init_properties[module_name] = get_init_properties(tree)
+
+    resolver = StaticResolver(visitors)
+    direct_bases = {}
+    summaries = {}
+    for import_name, visitor in visitors.items():
+        module_name = visitor.module_name
+        for name, class_def in visitor.class_defs.items():
+            class_name = TypeDef.make_class_name(module_name, name)
+            bases = []
+            for base in class_def.bases:
+                base_name = resolver.resolve(import_name, ast.unparse(base))
+                if base_name is None:
+                    base_name = ast.unparse(base)
+                if base_name not in ('object', 'builtins.object'):
+                    bases.append(base_name)
+            direct_bases[class_name] = bases
+            properties, methods = visitor.get_members(class_def)
+            init_props = init_properties[module_name].get(name, [])
+            summaries[class_name] = {
+                'module_name': module_name,
+                'name': name,
+                'properties': properties + init_props,
+                'methods': methods,
+                'base_class_names': [],
+                'init_properties': init_props
+            }
+
+    # Bases linearized depth first, as a simplified MRO
+    def get_base_class_names(class_name, base_class_names):
+        for base_name in direct_bases.get(class_name, []):
+            if base_name in base_class_names:
+                continue
+            base_class_names.append(base_name)
+            get_base_class_names(base_name, base_class_names)
+        return base_class_names
+
     class_types = {}
-    script_paths = list(script_dir_path.rglob('*.py'))
+    for class_name, summary in summaries.items():
+        base_class_names = get_base_class_names(class_name, [class_name])[1:]
+        summary = dict(summary, base_class_names=base_class_names)
+        for base_name in base_class_names:
+            if base_name in summaries:
+                summary['properties'] = summary['properties'] + \
+                    summaries[base_name]['properties']
+                summary['methods'] = summary['methods'] + \
+                    summaries[base_name]['methods']
+        class_types[class_name] = TypeDef.from_summary(summary)
+    return link_typedefs(class_types)
+
+
+class ModuleTimeout(Exception):
+    pass
+
+
+def _raise_module_timeout(signum, frame):
+    raise ModuleTimeout("module execution timed out")
+
+
+# Runs in a worker process: returns (summaries, None, seconds taken) or
+# (None, error, seconds taken)
+def get_module_summaries(script_dir_path, script_path, timeout=None):
+    started = perf_counter()
+    parent_path = str(script_dir_path.parent)
+    if parent_path not in sys.path:
+        sys.path.append(parent_path)
+    if timeout is not None:
+        signal.signal(signal.SIGALRM, _raise_module_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        module_types = get_module_typedefs(script_dir_path, script_path)
+        return [x.to_summary() for x in module_types.values()], None, \
+            perf_counter() - started
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}", perf_counter() - started
+    finally:
+        if timeout is not None:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+# Seconds a worker is given past timeout before the parent gives up on it,
+# for modules blocked where SIGALRM cannot interrupt them, e.g. in C code
+timeout_grace = 5.0
+
+
+# Multiprocessing context of a pool that keeps the worker processes it
+# starts, which the pool itself does not expose
+class WorkerContext:
+    def __init__(self):
+        self.context = multiprocessing.get_context()
+        self.processes = []
+
+    def Process(self, *args, **kwargs):
+        process = self.context.Process(*args, **kwargs)
+        self.processes.append(process)
+        return process
+
+    def __getattr__(self, name):
+        return getattr(self.context, name)
+
+
+# Kills the workers of an executor started with worker_context, some of
+# which may be stuck
+def terminate_pool(executor, worker_context):
+    for process in worker_context.processes:
+        if process.is_alive():
+            process.terminate()
+    executor.shutdown(wait=True, cancel_futures=True)
+
+
+# Runs get_module_summaries on each script path with at most window
+# modules in flight, so a module is timed from its submission. Returns
+# {script_path: (summaries, error, seconds taken)} and the paths that were
+# in flight when the pool broke or was killed, whose results are unknown.
+# A new pool is started after each break.
+def run_module_pool(script_dir_path, script_paths, jobs, window, timeout):
+    results = {}
+    interrupted = []
+    queue = list(reversed(script_paths))
+    while queue:
+        worker_context = WorkerContext()
+        executor = ProcessPoolExecutor(jobs, mp_context=worker_context)
+        running = {}
+        broken = False
+        try:
+            while (queue or running) and not broken:
+                while queue and len(running) < window:
+                    script_path = queue.pop()
+                    future = executor.submit(get_module_summaries,
+                                             script_dir_path, script_path,
+                                             timeout)
+                    deadline = None if timeout is None else \
+                        perf_counter() + timeout + timeout_grace
+                    running[future] = (script_path, deadline)
+                deadlines = [x for _, x in running.values() if x is not None]
+                wait_time = None if not deadlines else \
+                    max(0.0, min(deadlines) - perf_counter())
+                done, _ = wait(running, wait_time, FIRST_COMPLETED)
+                for future in done:
+                    script_path, _ = running.pop(future)
+                    try:
+                        results[script_path] = future.result()
+                    except BrokenProcessPool:
+                        interrupted.append(script_path)
+                        broken = True
+                    except Exception as e:
+                        results[script_path] = \
+                            None, f"{type(e).__name__}: {e}", 0.0
+                now = perf_counter()
+                for future, (script_path, deadline) in list(running.items()):
+                    if deadline is not None and now >= deadline:
+                        del running[future]
+                        results[script_path] = \
+                            None, "ModuleTimeout: worker did not answer " \
+                            f"within {timeout + timeout_grace}s", \
+                            now - deadline + timeout + timeout_grace
+                        broken = True
+        finally:
+            if broken:
+                terminate_pool(executor, worker_context)
+            else:
+                executor.shutdown()
+        interrupted += [script_path for script_path, _ in running.values()]
+    return results, interrupted
+
+
+# Executes modules in worker processes. Modules that were in flight when a
+# worker died or got stuck are executed again one at a time, so the module
+# at fault is the only one reported.
+def get_pool_summaries(script_dir_path, script_paths, jobs, timeout):
+    results, interrupted = run_module_pool(script_dir_path, script_paths,
+                                           jobs, jobs, timeout)
+    retried, interrupted = run_module_pool(script_dir_path, interrupted, 1,
+                                           1, timeout)
+    results.update(retried)
+    for script_path in interrupted:
+        results[script_path] = None, "BrokenProcessPool: worker died", 0.0
+    return results
+
+
+def from_summaries(summaries):
+    module_types = {}
+    for summary in summaries:
+        class_type = TypeDef.from_summary(summary)
+        module_types[class_type.class_name] = class_type
+    return module_types
+
+
+# With cache_path, module TypeDefs are stored per file and a module is only
+# executed again when its content or the content of a project module its
+# classes come from has changed.
+# With jobs, modules are executed in that many worker processes instead of
+# this one. A module failing, killing its worker or running longer than
+# timeout seconds is reported and skipped. timeout requires jobs, as only
+# a worker process can be interrupted or killed.
+# The STATIC mode executes nothing, so it ignores the options above.
+# Files are read and parsed through source_store, except in worker processes.
+def get_typedefs(script_dir_path, cache_path=None, jobs=None, timeout=None,
+                 mode=DYNAMIC, source_store=None) -> Dict[str, TypeDef]:
+    if source_store is None:
+        source_store = source.SourceStore()
+    if mode == STATIC:
+        return get_static_typedefs(script_dir_path, source_store)
+    if mode != DYNAMIC:
+        raise ValueError(f"Unknown typedef mode {mode}")
+    if timeout is not None and jobs is None:
+        raise ValueError("timeout requires jobs")
+    script_dir_path = Path(script_dir_path)
+    script_paths = source_store.get_script_paths(script_dir_path)
+    module_paths = {}
     for script_path in script_paths:
         module_name = make_module_name(script_dir_path, script_path)
-        tree = ast.parse(script_path.read_text())
-        compiled = compile(tree, "name", "exec")
-        module = ModuleType(module_name)
-        module.__loader__ = __loader__
-        module.__file__ = str(script_path)
-        module.__builtins__ = __builtins__
-        gvars = module.__dict__
-        try:
-            exec(compiled, gvars)
-        except SystemExit:
-            pass
-        classes = list(filter(isclass, gvars.values()))
-        for class_ in classes:
-            class_type = TypeDef(class_)
-            class_types[class_type.class_name] = class_type
-    sys.path.pop()
-
-    # add all base_class_types recursively
-    for class_type in list(class_types.values()):
-
-        def add_base_class(class_types_, class_type_):
-            for base_class in class_type_.base_classes:
-                if base_class in class_types_.keys():
-                    continue
-                base_class_type_ = TypeDef(base_class)
-                class_types_[base_class_type_.class_name] = base_class_type_
-                class_type_.base_class_types.append(base_class_type_)
-                add_base_class(class_types_, base_class_type_)
+        module_paths[module_name] = script_path.relative_to(
+            script_dir_path).as_posix()
+    typedef_cache = None
+    hashes = {}
+    if cache_path is not None:
+        typedef_cache = cache.FileCache(cache_path)
+        for script_path in script_paths:
+            key = script_path.relative_to(script_dir_path).as_posix()
+            hashes[key] = cache.hash_file(script_path)
 
-        add_base_class(class_types, class_type)
+    all_module_types = {}
+    missing_paths = []
+    for script_path in script_paths:
+        summaries = None
+        if typedef_cache is not None:
+            key = script_path.relative_to(script_dir_path).as_posix()
+            summaries = typedef_cache.get(key, hashes)
+        if summaries is None:
+            missing_paths.append(script_path)
+        else:
+            all_module_types[script_path] = from_summaries(summaries)
 
+    executed_module_types = {}
+    if jobs is None:
+        sys.path.append(str(script_dir_path.parent))
+        for script_path in missing_paths:
+            executed_module_types[script_path] = get_module_typedefs(
+                script_dir_path, script_path, source_store)
+        sys.path.pop()
+    else:
+        results = get_pool_summaries(script_dir_path, missing_paths, jobs,
+                                     timeout)
+        for script_path in missing_paths:
+            summaries, error, elapsed = results[script_path]
+            prof = profiler.current
+            if prof is not None:
+                prof.record('module exec', make_module_name(
+                    script_dir_path, script_path), elapsed)
+            if error is not None:
+                logger.warning(f"Skipping {script_path}: {error}")
+                continue
+            executed_module_types[script_path] = from_summaries(summaries)
+    all_module_types.update(executed_module_types)
+
+    class_types = {}
     for script_path in script_paths:
-        # get init properties
+        if script_path not in all_module_types:
+            continue
         module_name = make_module_name(script_dir_path, script_path)
-        tree = ast.parse(script_path.read_text())
-        methods_visitor = MethodsVisitor()
-        methods_visitor.visit(tree)
-        init_props_visitor = InitPropertiesVisitor(methods_visitor.methods)
-        init_props_visitor.visit(tree)
-        init_props = init_props_visitor.init_properties
-        for class_name, init_props in init_props.items():
-            name = TypeDef.make_class_name(module_name, class_name)
-            class_type = class_types[name]
-            class_type.init_properties = init_props
-            class_type.type.properties.extend(init_props)
-
-    # merge from base_class
-    for class_type in class_types.values():
-        props = class_type.type.properties
-        for base_class_type in class_type.base_class_types:
-            for base_class_init_prop in base_class_type.init_properties:
-                if base_class_init_prop in props:
-                    continue
-                props.append(base_class_init_prop)
-    return class_types
+        module_types = all_module_types[script_path]
+        if typedef_cache is not None and \
+                script_path in executed_module_types:
+            key = module_paths[module_name]
+            dep_keys = {key} | {
+                module_paths[x.module_name]
+                for x in module_types.values()
+                if x.module_name in module_paths
+            }
+            dep_hashes = {x: hashes[x] for x in dep_keys}
+            summaries = [x.to_summary() for x in module_types.values()]
+            typedef_cache.set(key, dep_hashes, summaries)
+        # The module defining a class takes precedence over importers
+        for name, class_type in module_types.items():
+            if name not in class_types or \
+                    class_type.module_name == module_name:
+                class_types[name] = class_type
+    if typedef_cache is not None:
+        typedef_cache.save()
+    return link_typedefs(class_types)
@@ -0,0 +1,123 @@
+from contextlib import nullcontext
+import json
+from pathlib import Path
+from time import perf_counter
+
+# The enabled Profiler, or None. Instrumented code only looks this up, so
+# phases and counters cost next to nothing while profiling is disabled:
+#     prof = profiler.current
+#     if prof is not None:
+#         prof.count('memory.join')
+current = None
+
+
+# Wall time of nested phases and counters of hot paths. Each phase is
+# charged its own time only, without the time of the phases nested in it,
+# so phase times add up.
+class Profiler:
+    def __init__(self):
+        self.started = perf_counter()
+        self.stopped = None
+        # [name, label, start time, time of nested phases] of open phases
+        self.stack = []
+        # Own time of each stack of phase names
+        self.stack_times = {}
+        # {phase name: {label: time}}, including nested phases
+        self.labeled_times = {}
+        self.counters = {}
+
+    def push(self, name, label=None):
+        self.stack.append([name, label, perf_counter(), 0.0])
+
+    def pop(self):
+        name, label, start, nested = self.stack.pop()
+        elapsed = perf_counter() - start
+        key = tuple(x[0] for x in self.stack) + (name, )
+        self.stack_times[key] = \
+            self.stack_times.get(key, 0.0) + elapsed - nested
+        if self.stack:
+            self.stack[-1][3] += elapsed
+        if label is not None:
+            self.record(name, label, elapsed)
+
+    # Time of a labeled phase measured elsewhere, e.g. in a worker process
+    def record(self, name, label, elapsed):
+        times = self.labeled_times.setdefault(name, {})
+        times[label] = times.get(label, 0.0) + elapsed
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def stop(self):
+        self.stopped = perf_counter()
+
+    def get_total_time(self):
+        stopped = perf_counter() if self.stopped is None else self.stopped
+        return stopped - self.started
+
+    # Own time of each phase name, wherever it was nested
+    def get_phase_times(self):
+        phase_times = {}
+        for key, elapsed in self.stack_times.items():
+            phase_times[key[-1]] = phase_times.get(key[-1], 0.0) + elapsed
+        return phase_times
+
+    def to_json(self):
+        return {
+            'total_time': self.get_total_time(),
+            'phase_times': self.get_phase_times(),
+            'stack_times': {';'.join(key): elapsed
+                            for key, elapsed in self.stack_times.items()},
+            'labeled_times': self.labeled_times,
+            'counters': self.counters
+        }
+
+    def write_json(self, path):
+        Path(path).write_text(json.dumps(self.to_json(), indent=2))
+
+    # Collapsed stacks, as read by flamegraph.pl and speedscope: one line of
+    # ';' separated phase names and own microseconds per stack
+    def write_collapsed(self, path):
+        lines = [f"{';'.join(key)} {round(elapsed * 1e6)}\n"
+                 for key, elapsed in self.stack_times.items()]
+        Path(path).write_text(''.join(lines))
+
+
+def enable():
+    global current
+    current = Profiler()
+    return current
+
+
+def disable():
+    global current
+    profiler, current = current, None
+    if profiler is not None:
+        profiler.stop()
+    return profiler
+
+
+class Phase:
+    def __init__(self, profiler, name, label):
+        self.profiler = profiler
+        self.name = name
+        self.label = label
+
+    def __enter__(self):
+        self.profiler.push(self.name, self.label)
+
+    def __exit__(self, *exc_info):
+        self.profiler.pop()
+
+
+# Entered instead of a Phase while profiling is disabled
+no_phase = nullcontext()
+
+
+# With label, the time of the phase is also recorded in labeled_times.
+# While profiling is disabled, a phase builds nothing and returns no_phase.
+def phase(name, label=None):
+    profiler = current
+    if profiler is None:
+        return no_phase
+    return Phase(profiler, name, label)
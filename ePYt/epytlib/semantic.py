@@ -1,8 +1,13 @@
 import ast
+import heapq
+import logging
 from . import graph
 from . import memory
 from . import domain
 from . import table
+from . import profiler
+
+logger = logging.getLogger(__name__)
 
 
 class LiftedValue:
@@ -63,9 +68,14 @@ class Lifter(ast.NodeVisitor):
         'repr': '__repr__', 'unicode': '__unicode__', 'size': '__sizeof__',
         'hash': '__hash__'}
 
-    def __init__(self, args):
+    # call_facts maps ast.Call nodes to (argument, HasAttr) pairs of the
+    # attributes the callee requires of its arguments
+    def __init__(self, args, call_facts=None):
         self.lifted_values = []
         self.args = args
+        if call_facts is None:
+            call_facts = {}
+        self.call_facts = call_facts
 
     def _add_method(self, key, value):
         self.lifted_values.append(HasMethod(key, value))
@@ -77,13 +87,18 @@ class Lifter(ast.NodeVisitor):
         self.lifted_values.append(HasAssigned(key))
 
     def lift(self, graph_node):
-        if len(graph_node.instr_list) == 2:  # for branch
-            for_iter = graph_node.instr_list[1]
+        return self.lift_stmts(graph_node.instr_list,
+                               isinstance(graph_node, self.handling_types))
+
+    # Statements of a node, handled unless the node is a FuncDefNode
+    def lift_stmts(self, instr_list, handled):
+        if len(instr_list) == 2:  # for branch
+            for_iter = instr_list[1]
             if isinstance(for_iter, ast.Name) and \
                     ast.unparse(for_iter) in self.args:
                 self._add_method(ast.unparse(for_iter), '__iter__')
-        if isinstance(graph_node, self.handling_types):
-            for instr in graph_node.instr_list:
+        if handled:
+            for instr in instr_list:
                 self.visit(instr)
         return self.lifted_values
 
@@ -106,6 +121,13 @@ class Lifter(ast.NodeVisitor):
             self._add_method(arg_key, self.op_to_method[type(node.ops[0])])
 
     def visit_Call(self, node):
+        for arg, has_attr in self.call_facts.get(node, ()):
+            arg_key = ast.unparse(arg)
+            if arg_key in self.args:
+                for prop in has_attr.properties:
+                    self._add_property(arg_key, prop)
+                for method in has_attr.methods:
+                    self._add_method(arg_key, method)
         fun_name = ast.unparse(node.func)
         if isinstance(node.func, ast.Attribute):
             arg_key = ast.unparse(node.func.value)
@@ -155,40 +177,364 @@ class Semantic:
             if key not in ret_dict:
                 ret_dict[key] = domain.HasAttr()
             if isinstance(has_attr_info, HasMethod):
-                ret_dict[key].methods.append(has_attr_info.lifted_value)
+                ret_dict[key].add_method(has_attr_info.lifted_value)
             elif isinstance(has_attr_info, HasProperty):
-                ret_dict[key].properties.append(has_attr_info.lifted_value)
+                ret_dict[key].add_property(has_attr_info.lifted_value)
             elif isinstance(has_attr_info, HasAssigned):
                 has_fixed_list.append(key)
-        return list(ret_dict.items()), has_fixed_list
-
-    def __init__(self, func_def):
+        return [(key, domain.value_table.hash_cons(value))
+                for key, value in ret_dict.items()], has_fixed_list
+
+    SWEEP = 'sweep'
+    WORKLIST = 'worklist'
+
+    # Storage modes: memories of every node, or only of nodes other than
+    # those with a single prev and a single succ, the others being
+    # recomputed when needed
+    FULL_STORAGE = 'full'
+    MERGE_STORAGE = 'merge'
+
+    # Passes before the memories of loop headers are widened
+    widening_delay = 2
+    # Passes, each evaluating a node at most once, before giving up on
+    # reaching the fixed point
+    max_node_evaluations = 64
+
+    # With sparse, the fixpoint only runs over the nodes sparsify keeps.
+    # call_facts is passed on to the Lifter.
+    def __init__(self, func_def, mode=WORKLIST, sparse=False,
+                 storage=FULL_STORAGE, call_facts=None):
         self.reached_fixed_point = False
+        self.call_facts = call_facts
         self.initial_mem = memory.Memory()
         self.args = []
+        # Number of transfer_node calls, to compare fixpoint modes
+        self.evaluations = 0
+        # Passes over the nodes in reverse postorder
+        self.iterations = 0
         for arg in func_def.args.args:
             self.args.append(arg.arg)
             if arg.annotation:
                 initial_arg = (arg.arg, domain.AnnotatedType(arg.annotation))
                 self.initial_mem = self.initial_mem.add(initial_arg)
-        self.table = table.Table(func_def.graph.nodes, self.initial_mem)
+        self.graph = func_def.graph
+        self.preds = self.graph.get_preds()
+        # Lifted facts never change between iterations, so lift them once
+        self.facts = {}
+        for graph_node in self.graph.nodes:
+            self.facts[graph_node] = self.lift_node(graph_node)
+        self.succs = self.graph.get_succs()
+        self.order = {node: index for index, node in enumerate(
+            self.graph.reverse_postorder(self.succs))}
+        self.headers = self.get_loop_headers()
+        # Limits of each loop header widened so far, the only nodes widened
+        self.limits = {}
+        # Components by the argument their nodes do not assign, or None for
+        # all nodes, and limits of the components of each argument
+        self.components = {}
+        self.component_limits = {}
+        # Kept node representing each node, when sparse
+        self.reps = None
+        # Tables are keyed by node, or by node ID for a CompactGraph
+        if sparse:
+            self.sparsify()
+        # Nodes whose memory is stored, or None for every node
+        self.stored = None
+        # Last computed memory of a node that is not stored
+        self.last = (None, None)
+        if storage == self.MERGE_STORAGE:
+            self.stored = self.get_stored_nodes()
+            self.table = table.Table(
+                filter(self.stored.__contains__, self.order),
+                self.initial_mem)
+        elif storage != self.FULL_STORAGE:
+            raise ValueError(f"Unknown storage mode {storage}")
+        elif self.reps is not None:
+            self.table = table.Table(self.order, self.initial_mem)
+        else:
+            self.table = self.graph.make_table(self.initial_mem)
+        if mode == self.SWEEP:
+            self.run_sweep()
+        elif mode == self.WORKLIST:
+            self.run_worklist()
+        else:
+            raise ValueError(f"Unknown fixpoint mode {mode}")
+        prof = profiler.current
+        if prof is not None:
+            prof.count('semantic.runs')
+            prof.count('semantic.nodes', len(self.order))
+            prof.count('semantic.iterations', self.iterations)
+            prof.count('semantic.evaluations', self.evaluations)
+        # The table is then short of attributes later evaluations would add
+        if not self.reached_fixed_point:
+            if prof is not None:
+                prof.count('semantic.capped')
+            logger.warning(
+                f"No fixed point for {func_def.function_name} (line "
+                f"{func_def.node.lineno}) within {self.max_node_evaluations} "
+                f"evaluations of a node, its types may be too broad")
+
+    # Targets of back-edges, the nodes a prev of which is not before them in
+    # reverse postorder
+    def get_loop_headers(self):
+        order = self.order
+        return {node for node, index in order.items()
+                if any(order[prev] >= index for prev in self.preds[node])}
+
+    # Keeps nodes lifting facts of an argument, join points and loop
+    # headers. Any other node has a single prev, whose memory it passes on
+    # unchanged (facts of other names are added and fixed away at once), so
+    # it is represented by the closest kept node before it, or by None if
+    # there is none. Kept nodes are linked to the representatives of their
+    # prevs.
+    def sparsify(self):
+        args = set(self.args)
+        self.reps = {}
+        for node in self.order:
+            preds = self.preds[node]
+            if any(x in args for x, _ in self.facts[node][0]) or \
+                    len(preds) > 1 or node in self.headers:
+                self.reps[node] = node
+            else:  # The prev of a node that is no header is already seen
+                self.reps[node] = self.reps[preds[0]] if preds else None
+        kept = [node for node, rep in self.reps.items() if node == rep]
+        if len(kept) == len(self.order):  # Nothing to drop
+            self.reps = None
+            return
+        self.preds = {
+            node: tuple(dict.fromkeys(
+                self.reps[x] for x in self.preds[node]
+                if self.reps[x] is not None))
+            for node in kept
+        }
+        self.succs = {node: [] for node in kept}
+        for node in kept:
+            for prev in self.preds[node]:
+                self.succs[prev].append(node)
+        self.order = {node: index for index, node in enumerate(kept)}
+
+    # Merge points, loop headers, branching nodes, entries and exits. Any
+    # other node directly follows its only prev in reverse postorder, so
+    # its memory is still at hand when its succ is evaluated.
+    def get_stored_nodes(self):
+        return {node for node in self.order
+                if len(self.preds[node]) != 1 or len(self.succs[node]) != 1
+                or node in self.headers}
+
+    def is_stored(self, table_key):
+        return self.stored is None or table_key in self.stored
+
+    # Memory of any node of the graph, also of nodes sparsify dropped or
+    # whose memory is not stored
+    def get_memory(self, graph_node):
+        if self.reps is not None:
+            graph_node = self.reps[graph_node]
+            if graph_node is None:
+                return self.initial_mem
+        if not self.is_stored(graph_node):
+            return self.recompute(graph_node)
+        return self.table[graph_node]
+
+    # Applies transfers from the closest node before table_key that is
+    # stored or was the last computed, which then becomes table_key
+    def recompute(self, table_key):
+        chain = []
+        while not self.is_stored(table_key) and \
+                self.last[0] != table_key:
+            chain.append(table_key)
+            table_key = self.preds[table_key][0]
+        memory_ = self.load_memory(table_key)
+        for table_key in reversed(chain):
+            memory_ = self.compute_node(table_key, memory_)
+        if chain:
+            self.last = (table_key, memory_)
+        return memory_
+
+    # Table of the memories of every node of the graph, in the order of the
+    # table of a dense run with full storage, so that both join to the same
+    # memory
+    def get_node_table(self):
+        if self.reps is None and self.stored is None:
+            return self.table
+        return table.ComputedTable(self.graph.nodes, self.get_memory)
+
+    def load_memory(self, table_key):
+        if self.is_stored(table_key):
+            return self.table[table_key]
+        if self.last[0] == table_key:
+            return self.last[1]
+        return self.recompute(table_key)
+
+    # Join of the facts of each argument lifted on a cycle through header
+    # along which the argument is not assigned. Facts after an assignment
+    # only add to a fixed value, and facts out of the loop never reach
+    # header, so any value of the argument at header that is not fixed
+    # stays within the limit. Nodes sparsify drops neither lift facts of
+    # arguments nor assign them, so the edges between kept nodes are
+    # enough.
+    def get_limits(self, header):
+        if header in self.limits:
+            return self.limits[header]
+        limits = self.limits[header] = {}
+        for arg_key in self.args:
+            components, component_limits = self.get_component_limits(arg_key)
+            if header in components:
+                limit = component_limits.get(components[header], None)
+                if limit is not None:
+                    limits[arg_key] = limit
+        return limits
+
+    # Components of the nodes that do not assign arg_key, and the join of
+    # the facts of arg_key in each component
+    def get_component_limits(self, arg_key):
+        if arg_key in self.component_limits:
+            return self.component_limits[arg_key]
+        if any(arg_key in fixed for _, fixed in self.facts.values()):
+            components = self.get_components(arg_key)
+        else:
+            components = self.get_components()
+        bits = {}
+        for node, component in components.items():
+            for key, lifted_value in self.facts[node][0]:
+                if key == arg_key:
+                    property_bits, method_bits = bits.get(component, (0, 0))
+                    bits[component] = (
+                        property_bits | lifted_value.property_bits,
+                        method_bits | lifted_value.method_bits)
+        component_limits = {
+            component: domain.HasAttr.make(property_bits, method_bits)
+            for component, (property_bits, method_bits) in bits.items()}
+        self.component_limits[arg_key] = components, component_limits
+        return components, component_limits
+
+    # Strongly connected components of the graph without the nodes that
+    # assign arg_key, as {node: root of its component}, by Tarjan's
+    # algorithm
+    def get_components(self, arg_key=None):
+        if arg_key in self.components:
+            return self.components[arg_key]
+        facts, succs = self.facts, self.succs
+        indices = {}
+        low = {}
+        stack = []
+        on_stack = set()
+        components = {}
+        for root in self.order:
+            if root in indices or arg_key in facts[root][1]:
+                continue
+            indices[root] = low[root] = len(indices)
+            stack.append(root)
+            on_stack.add(root)
+            path = [(root, iter(succs[root]))]
+            while path:
+                node, children = path[-1]
+                for child in children:
+                    if arg_key in facts[child][1]:
+                        continue
+                    if child not in indices:
+                        indices[child] = low[child] = len(indices)
+                        stack.append(child)
+                        on_stack.add(child)
+                        path.append((child, iter(succs[child])))
+                        break
+                    if child in on_stack:
+                        low[node] = min(low[node], indices[child])
+                else:
+                    path.pop()
+                    if path:
+                        parent = path[-1][0]
+                        low[parent] = min(low[parent], low[node])
+                    if low[node] == indices[node]:
+                        member = None
+                        while member != node:
+                            member = stack.pop()
+                            on_stack.remove(member)
+                            components[member] = node
+        self.components[arg_key] = components
+        return components
+
+    def get_input_mem(self, table_key):
+        input_mem = memory.Memory()
+        for prev in self.preds[table_key]:
+            input_mem = input_mem.join(self.load_memory(prev))
+        return input_mem
+
+    # Re-evaluate every node until nothing changes
+    def run_sweep(self):
         while not self.reached_fixed_point:
+            if self.iterations == self.max_node_evaluations:
+                return
+            self.iterations += 1
             self.reached_fixed_point = True
-            for table_key in self.table.table.keys():
-                input_mem = memory.Memory()
-                for prev in table_key.prev:
-                    input_mem = input_mem.join(self.table[prev])
-                self.transfer_node(table_key, input_mem)
-
-    def transfer_node(self, table_key, input_mem):
-        lifted_value_list = Lifter(self.args).lift(table_key)
+            for table_key in self.order:
+                input_mem = self.get_input_mem(table_key)
+                if self.transfer_node(table_key, input_mem) and \
+                        self.is_stored(table_key):
+                    self.reached_fixed_point = False
+
+    # Re-evaluate a node only when the memory of one of its prev changed.
+    # Joins are not commutative, so memories depend on the order nodes are
+    # evaluated in. Pending nodes are thus evaluated in the passes of
+    # run_sweep, a node made pending by a later one waiting for the next
+    # pass, so that both modes reach the same memories.
+    def run_worklist(self):
+        succs, order = self.succs, self.order
+        worklist = list(order.values())
+        heapq.heapify(worklist)
+        next_worklist = []
+        pending = set(order.keys())
+        nodes = list(order.keys())
+        while worklist:
+            if self.iterations == self.max_node_evaluations:
+                return
+            self.iterations += 1
+            while worklist:
+                index = heapq.heappop(worklist)
+                table_key = nodes[index]
+                pending.remove(table_key)
+                if not self.transfer_node(table_key,
+                                          self.get_input_mem(table_key)):
+                    continue
+                for succ in succs[table_key]:
+                    if succ not in pending:
+                        pending.add(succ)
+                        heapq.heappush(worklist if order[succ] > index
+                                       else next_worklist, order[succ])
+            worklist, next_worklist = next_worklist, worklist
+        self.reached_fixed_point = True
+
+    # Returns ((arg_key, HasAttr), ...) and the frozenset of fixed arg_keys
+    def lift_node(self, graph_node):
+        lifted_value_list = Lifter(self.args, self.call_facts).lift_stmts(
+            *self.graph.get_stmts(graph_node))
         has_attr_list, has_fixed_list = \
             self.convert_to_has_attr_list(lifted_value_list)
+        return tuple(has_attr_list), frozenset(has_fixed_list)
+
+    def compute_node(self, table_key, input_mem):
+        has_attr_list, has_fixed_set = self.facts[table_key]
         new_memory = self.initial_mem.join(input_mem)
         for arg_key, lifted_value in has_attr_list:
             new_memory = new_memory.add((arg_key, lifted_value))
-            if arg_key in has_fixed_list:
-                new_memory.fix(arg_key)
+            if arg_key in has_fixed_set:
+                new_memory = new_memory.fix(arg_key)
+        return new_memory
+
+    # Returns whether the memory of table_key has changed, which is assumed
+    # for nodes whose memory is not stored
+    def transfer_node(self, table_key, input_mem):
+        self.evaluations += 1
+        new_memory = self.compute_node(table_key, input_mem)
+        if not self.is_stored(table_key):
+            self.last = (table_key, new_memory)
+            return True
+        if new_memory == self.table[table_key]:
+            return False
+        if table_key in self.headers and \
+                self.iterations > self.widening_delay:
+            new_memory = self.table[table_key].widen(
+                new_memory, self.get_limits(table_key))
         if new_memory != self.table[table_key]:
             self.table[table_key] = new_memory
-            self.reached_fixed_point = False
+            return True
+        return False
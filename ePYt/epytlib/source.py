@@ -0,0 +1,78 @@
+import ast
+from copy import deepcopy
+from fnmatch import fnmatch
+import os
+from pathlib import Path
+from . import profiler
+
+
+# Source text and AST of each file, parsed once and shared by every stage.
+# An entry is parsed again only when the mtime or size of its file changes.
+# Shared trees must not be mutated; stages that mutate take a copy_tree.
+# include and exclude select the files of a project every stage analyzes.
+class SourceStore:
+    def __init__(self, include=(), exclude=()):
+        self.include = tuple(include)
+        self.exclude = tuple(exclude)
+        self.entries = {}
+        self.parses = 0
+        self.copies = 0
+
+    def get_entry(self, path):
+        path = Path(path).resolve()
+        stat = path.stat()
+        stat_key = (stat.st_mtime_ns, stat.st_size)
+        entry = self.entries.get(path, None)
+        if entry is None or entry[0] != stat_key:
+            with profiler.phase('parsing'):
+                source = path.read_text()
+                self.parses += 1
+                entry = (stat_key, source, ast.parse(source))
+            self.entries[path] = entry
+        return entry
+
+    @staticmethod
+    def match_any(relative_path, patterns):
+        return any(fnmatch(relative_path, x) for x in patterns)
+
+    # Python files under dir_path in a stable order. Patterns are matched
+    # against paths relative to dir_path with fnmatch, whose * also matches
+    # '/'. Excluded directories are not walked into at all.
+    def get_script_paths(self, dir_path):
+        dir_path = Path(dir_path)
+        script_paths = []
+        for root, dir_names, file_names in os.walk(dir_path):
+            root = Path(root)
+            relative_root = root.relative_to(dir_path).as_posix()
+            prefix = '' if relative_root == '.' else relative_root + '/'
+            dir_names[:] = sorted(
+                x for x in dir_names
+                if not self.match_any(prefix + x, self.exclude)
+                and not self.match_any(prefix + x + '/', self.exclude))
+            for file_name in sorted(file_names):
+                relative_path = prefix + file_name
+                if not file_name.endswith('.py') or \
+                        self.match_any(relative_path, self.exclude):
+                    continue
+                if self.include and \
+                        not self.match_any(relative_path, self.include):
+                    continue
+                script_paths.append(root / file_name)
+        return script_paths
+
+    def get_source(self, path):
+        return self.get_entry(path)[1]
+
+    def get_tree(self, path):
+        return self.get_entry(path)[2]
+
+    # Whether path has an entry, possibly stale
+    def is_parsed(self, path):
+        return Path(path).resolve() in self.entries
+
+    def evict(self, path):
+        self.entries.pop(Path(path).resolve(), None)
+
+    def copy_tree(self, tree):
+        self.copies += 1
+        return deepcopy(tree)
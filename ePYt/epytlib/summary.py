@@ -0,0 +1,240 @@
+import ast
+import hashlib
+import json
+from . import cache, domain, profiler, semantic, type_inferrer
+
+
+# Calls between the functions of a project, keyed as in AnalysisResult.
+# A called name resolves to a function or class (its __init__) of the same
+# file, else to the one function or class of that name in the project, and
+# self.name to a method of the same class.
+class CallGraph:
+    def __init__(self, func_list):
+        self.func_defs = dict(func_list)
+        self.file_names, self.project_names = self.get_names(self.func_defs)
+        # {key: {ast.Call: (callee key, [(argument, parameter name)])}}
+        self.calls = {key: self.get_calls(key) for key in self.func_defs}
+
+    # {path: {name: key}} and {name: key} of names defined once in the
+    # project, of the functions and the __init__ of classes among keys
+    @staticmethod
+    def get_names(keys):
+        file_names = {}
+        project_names = {}
+        for key in keys:
+            path, class_name, function_name = key
+            if class_name is None:
+                name = function_name
+            elif function_name == '__init__':
+                name = class_name
+            else:
+                continue
+            file_names.setdefault(path, {})[name] = key
+            project_names.setdefault(name, []).append(key)
+        return file_names, {name: keys[0]
+                            for name, keys in project_names.items()
+                            if len(keys) == 1}
+
+    # Callee key and number of leading parameters bound by the call
+    def resolve(self, key, func):
+        path, class_name, _ = key
+        if isinstance(func, ast.Name):
+            callee = self.file_names.get(path, {}).get(
+                func.id, self.project_names.get(func.id, None))
+            if callee is None:
+                return None
+            return callee, self.get_bound(callee, self.func_defs[callee])
+        args = self.func_defs[key].args.args
+        if not self.get_bound(key, self.func_defs[key]) or not args or \
+                not isinstance(func, ast.Attribute) or \
+                ast.unparse(func.value) != args[0].arg:
+            return None
+        callee = (path, class_name, func.attr)
+        if callee not in self.func_defs:
+            return None
+        return callee, self.get_bound(callee, self.func_defs[callee])
+
+    @staticmethod
+    def is_staticmethod(node):
+        return 'staticmethod' in map(ast.unparse, node.decorator_list)
+
+    # Number of leading parameters of a function bound when it is called,
+    # 1 for methods but static methods
+    @classmethod
+    def get_bound(cls, key, func_def):
+        if key[1] is None or cls.is_staticmethod(func_def.node):
+            return 0
+        return 1
+
+    # Arguments of call passed to each parameter of the callee, up to the
+    # first starred argument
+    def bind(self, call, callee, bound):
+        params = [x.arg for x in self.func_defs[callee].args.args][bound:]
+        pairs = []
+        for arg, param in zip(call.args, params):
+            if isinstance(arg, ast.Starred):
+                break
+            pairs.append((arg, param))
+        for keyword in call.keywords:
+            if keyword.arg in params:
+                pairs.append((keyword.value, keyword.arg))
+        return pairs
+
+    def get_calls(self, key):
+        calls = {}
+        for node in ast.walk(self.func_defs[key].node):
+            if not isinstance(node, ast.Call):
+                continue
+            resolved = self.resolve(key, node.func)
+            if resolved is not None:
+                calls[node] = (resolved[0], self.bind(node, *resolved))
+        return calls
+
+    def get_callees(self, key):
+        return list(dict.fromkeys(x for x, _ in self.calls[key].values()))
+
+    # Strongly connected components, each after the components it calls
+    # (Tarjan's algorithm, without recursion)
+    def get_components(self):
+        index = {}
+        lowlink = {}
+        stack = []
+        on_stack = set()
+        components = []
+        for root in self.calls:
+            if root in index:
+                continue
+            index[root] = lowlink[root] = len(index)
+            stack.append(root)
+            on_stack.add(root)
+            work = [(root, iter(self.get_callees(root)))]
+            while work:
+                key, callees = work[-1]
+                for callee in callees:
+                    if callee not in index:
+                        index[callee] = lowlink[callee] = len(index)
+                        stack.append(callee)
+                        on_stack.add(callee)
+                        work.append((callee, iter(self.get_callees(callee))))
+                        break
+                    if callee in on_stack:
+                        lowlink[key] = min(lowlink[key], index[callee])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        lowlink[parent] = min(lowlink[parent], lowlink[key])
+                    if lowlink[key] == index[key]:
+                        component = []
+                        while not component or component[-1] != key:
+                            component.append(stack.pop())
+                            on_stack.remove(component[-1])
+                        components.append(component[::-1])
+        return components
+
+
+# Per-function summaries over a CallGraph: the attributes each parameter
+# requires, those required by the callees it is passed to included.
+# Components are summarized callees first, so each summary is computed once,
+# and functions of a recursive component are re-lifted until their summaries
+# are stable. With cache_path, summaries of a component are reused while
+# the functions of the component and the summaries of their callees are
+# unchanged.
+class Summaries:
+    def __init__(self, call_graph, cache_path=None):
+        self.call_graph = call_graph
+        # {key: {arg_key: attribute names}}, as TypeInferrer.get_lifted_attrs
+        self.lifted_attrs = {}
+        # {key: {parameter name: [property names, method names]}}
+        self.param_attrs = {}
+        # Fingerprint of the component of each key, its cache key
+        self.fingerprints = {}
+        # Semantic runs, none for cached components
+        self.computed_count = 0
+        self.cache = None
+        if cache_path is not None:
+            self.cache = cache.FileCache(cache_path)
+        with profiler.phase('summaries'):
+            for component in call_graph.get_components():
+                self.summarize(component)
+        if self.cache is not None:
+            self.cache.save()
+
+    def summarize(self, component):
+        fingerprint = self.get_fingerprint(component)
+        entry = None
+        if self.cache is not None:
+            entry = self.cache.get(fingerprint, {})
+        if entry is None:
+            entry = self.compute(component)
+            if self.cache is not None:
+                self.cache.set(fingerprint, {}, entry)
+        for key, (lifted_attrs, param_attrs) in zip(component, entry):
+            self.lifted_attrs[key] = lifted_attrs
+            self.param_attrs[key] = param_attrs
+            self.fingerprints[key] = fingerprint
+
+    # Hash of the functions of component, what their calls resolve to and
+    # the fingerprints of callees outside of component
+    def get_fingerprint(self, component):
+        data = []
+        for key in component:
+            calls = [[str(callee[0]), callee[1], callee[2],
+                      self.fingerprints.get(callee, None),
+                      [param for _, param in pairs]]
+                     for callee, pairs in self.call_graph.calls[key].values()]
+            data.append([self.call_graph.func_defs[key].get_fingerprint(),
+                         calls])
+        return hashlib.sha256(json.dumps(data).encode()).hexdigest()
+
+    def compute(self, component):
+        recursive = len(component) > 1 or \
+            component[0] in self.call_graph.get_callees(component[0])
+        changed = True
+        while changed:
+            changed = False
+            for key in component:
+                lifted_attrs, param_attrs = self.lift(key)
+                self.lifted_attrs[key] = lifted_attrs
+                if param_attrs != self.param_attrs.get(key, None):
+                    self.param_attrs[key] = param_attrs
+                    changed = recursive
+        return [[self.lifted_attrs[key], self.param_attrs[key]]
+                for key in component]
+
+    # Table of key with the summaries of its callees applied
+    def get_table(self, key):
+        with profiler.phase('fixpoint'):
+            return semantic.Semantic(
+                self.call_graph.func_defs[key],
+                storage=semantic.Semantic.MERGE_STORAGE,
+                call_facts=self.get_call_facts(key)).get_node_table()
+
+    def lift(self, key):
+        self.computed_count += 1
+        func_def = self.call_graph.func_defs[key]
+        joined_memory = type_inferrer.TypeInferrer.join_table(
+            self.get_table(key))
+        lifted_attrs = {arg_key: lifted_value.attributes
+                        for arg_key, lifted_value in
+                        joined_memory.memory.items()}
+        param_attrs = {}
+        for arg in func_def.args.args:
+            value = joined_memory.memory.get(arg.arg, None)
+            if isinstance(value, domain.HasAttr) and value.attribute_bits:
+                param_attrs[arg.arg] = [value.properties, value.methods]
+        return lifted_attrs, param_attrs
+
+    # {ast.Call: [(argument, HasAttr required by the callee)]} of the calls
+    # of key to summarized functions
+    def get_call_facts(self, key):
+        call_facts = {}
+        for call, (callee, pairs) in self.call_graph.calls[key].items():
+            param_attrs = self.param_attrs.get(callee, {})
+            facts = [(arg, domain.HasAttr.make(
+                domain.to_bits(param_attrs[param][0]),
+                domain.to_bits(param_attrs[param][1])))
+                     for arg, param in pairs if param in param_attrs]
+            if facts:
+                call_facts[call] = facts
+        return call_facts
@@ -11,8 +11,61 @@ class Table:
     def __setitem__(self, key, value):
         self.table[key] = value
 
+    def keys(self):
+        return self.table.keys()
+
+    def values(self):
+        return self.table.values()
+
     def __str__(self):
         return '\n'.join(map(str, self.table.items()))
 
     def __repr__(self):
         return f"<Table{str(self)}>"
+
+
+# Memory of each node ID of a CompactGraph, stored in a list
+class ArrayTable:
+    def __init__(self, node_count, initial_memory):
+        self.table = [initial_memory] * node_count
+
+    def __getitem__(self, item):
+        return self.table[item]
+
+    def __setitem__(self, key, value):
+        self.table[key] = value
+
+    def keys(self):
+        return range(len(self.table))
+
+    def values(self):
+        return self.table
+
+    def __str__(self):
+        return '\n'.join(map(str, enumerate(self.table)))
+
+    def __repr__(self):
+        return f"<ArrayTable{str(self)}>"
+
+
+# Memory of each of graph_nodes, computed by get_memory when read instead of
+# stored. values follows the order of graph_nodes.
+class ComputedTable:
+    def __init__(self, graph_nodes, get_memory):
+        self.graph_nodes = graph_nodes
+        self.get_memory = get_memory
+
+    def __getitem__(self, item):
+        return self.get_memory(item)
+
+    def keys(self):
+        return self.graph_nodes
+
+    def values(self):
+        return map(self.get_memory, self.graph_nodes)
+
+    def __str__(self):
+        return '\n'.join(map(str, zip(self.keys(), self.values())))
+
+    def __repr__(self):
+        return f"<ComputedTable{str(self)}>"
@@ -0,0 +1,12 @@
+import os
+
+
+# Runs every test module of the package with
+#     python -m unittest ePYt.epytlib.tests
+def load_tests(loader, standard_tests, pattern):
+    this_dir = os.path.dirname(__file__)
+    top_level_dir = os.path.dirname(os.path.dirname(os.path.dirname(
+        this_dir)))
+    standard_tests.addTests(loader.discover(
+        this_dir, pattern or 'test*.py', top_level_dir))
+    return standard_tests
@@ -0,0 +1,183 @@
+import ast
+import random
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from .. import analysis
+
+SOURCE = '''
+def func(a, b, c):
+    a.method()
+    if a > 0:
+        b = a + 1
+        for x in c:
+            print(x.prop)
+    else:
+        c.append(b)
+        while a:
+            a.other()
+    return len(c)
+'''
+
+TARGET_SOURCE = '''
+class A:
+    prop = 1
+
+    def __init__(self):
+        self.x = 1
+
+    def method(self):
+        pass
+
+
+class B(A):
+    def __init__(self):
+        super().__init__()
+        self.y = 2
+
+    def __len__(self):
+        return 0
+
+
+class C:
+    def method(self):
+        pass
+
+    def __iter__(self):
+        return iter([])
+'''
+
+FUNC_SOURCE = '''
+def func(a, b, c):
+    a.method()
+    b.x = a.prop
+    for y in c:
+        len(b)
+'''
+
+CALLS_SOURCE = '''
+class D:
+    def add(self, o):
+        return self.get(o) + 1
+
+    def get(self, o):
+        return o.prop
+
+
+def even(x, k):
+    if k:
+        return odd(x, k - 1)
+    return x.method()
+
+
+def odd(x, k):
+    return even(x=x, k=k) or x.prop
+
+
+def run(x):
+    even(x, 3)
+'''
+
+SEEDED_SOURCE = '''
+def use(x, y, z, q):
+    x.method()
+    len(y)
+    len(z)
+    q.prop
+
+
+def main(w):
+    use(B(), [], w, [])
+    use(x=A(), y=[1], z=w, q=())
+
+
+class K:
+    @staticmethod
+    def s(other):
+        other.run(1)
+
+    def run(self, v):
+        v.prop
+'''
+
+
+def make_target_dir(tmp_dir, source=TARGET_SOURCE):
+    target_dir = Path(tmp_dir) / 'epyt_test_target'
+    target_dir.mkdir()
+    (target_dir / 'target.py').write_text(source)
+    return target_dir
+
+
+def make_func_def(source=SOURCE):
+    return analysis.FuncDef(ast.parse(source).body[0])
+
+
+# Source of a random function of a, b and c, which uses, reassigns and
+# branches on them, with loops unless loop_free
+def make_random_source(seed, loop_free=False):
+    rand = random.Random(seed)
+    lines = ['def func(a, b, c):']
+
+    def add_block(indent, depth):
+        for _ in range(rand.randint(1, 3 if depth else 8)):
+            v, w = rand.choice('abc'), rand.choice('abc')
+            n = rand.randrange(4)
+            kinds = ['method', 'property', 'assign', 'copy', 'local']
+            if depth < 3:
+                kinds += ['if'] if loop_free else ['if', 'for', 'while']
+            kind = rand.choice(kinds)
+            pad = '    ' * indent
+            if kind == 'method':
+                lines.append(f"{pad}{v}.m{n}()")
+            elif kind == 'property':
+                lines.append(f"{pad}{v}.p{n}")
+            elif kind == 'assign':
+                lines.append(f"{pad}{v} = {w}.q{n}")
+            elif kind == 'copy':
+                lines.append(f"{pad}{v} = {w}")
+            elif kind == 'local':
+                lines.append(f"{pad}x = {n}")
+            else:
+                test = rand.choice([f"{v}.p{n}", 'x'])
+                lines.append({'if': f"{pad}if {test}:",
+                              'for': f"{pad}for i{depth} in {v}:",
+                              'while': f"{pad}while {v}.w{n}():"}[kind])
+                add_block(indent + 1, depth + 1)
+                if kind == 'if' and rand.random() < 0.5:
+                    lines.append(f"{pad}else:")
+                    add_block(indent + 1, depth + 1)
+
+    add_block(1, 0)
+    return '\n'.join(lines) + '\n'
+
+
+# {key: {arg_key: [class name]}} of an AnalysisResult
+def get_type_names(result):
+    return {key: {x: [y.class_name for y in types]
+                  for x, types in arg_types.items()}
+            for key, arg_types in result.arg_types.items()}
+
+
+# Test case with a fresh target project per test, in a temporary directory
+# removed afterwards. target_dir holds target.py and the {file name:
+# source} of files; cache_dir is free to use.
+class TargetTestCase(TestCase):
+    files = {}
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.tmp_dir = Path(tmp_dir.name)
+        self.target_dir = make_target_dir(self.tmp_dir)
+        self.cache_dir = self.tmp_dir / 'cache'
+        for name, source in self.files.items():
+            (self.target_dir / name).write_text(source)
+
+    def analyze(self, analyzer_class=analysis.Analyzer, **options):
+        return analyzer_class(self.target_dir, **options)
+
+    # Types of each analyzer's result are the same as those of expected
+    def assertSameTypes(self, analyzers, expected):
+        for analyzer in analyzers:
+            self.assertEqual(get_type_names(analyzer.result), expected)
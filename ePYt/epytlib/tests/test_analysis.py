@@ -0,0 +1,94 @@
+from pathlib import Path
+
+from .. import analysis, annotator, preanalysis, profiler, source
+from .fixtures import FUNC_SOURCE, SOURCE, TargetTestCase, get_type_names
+
+
+class AnalyzerTestCase(TargetTestCase):
+    files = {'func.py': FUNC_SOURCE}
+
+    def test_one_parse_per_file(self):
+        analyzer = self.analyze()
+        source_store = analyzer.source_store
+        self.assertEqual(source_store.parses, 2)
+        self.assertEqual(source_store.copies, 0)
+        func_info = next(x for x in analyzer.file_infos
+                         if x.path.name == 'func.py')
+        arg_types = analyzer.result[analysis.AnalysisResult.make_key(
+            func_info, None, 'func')]
+        self.assertEqual([x.name for x in arg_types['c']], ['C'])
+        annotator.Annotator.annotate_dir(self.target_dir, analyzer.result,
+                                         source_store)
+        self.assertEqual(source_store.parses, 2)
+        self.assertEqual(source_store.copies, 2)
+        annotated = (Path(f"{self.target_dir}.annotated") / 'func.py')
+        self.assertIn('def func(a: Union[A, B]', annotated.read_text())
+
+    def test_parallel_analysis(self):
+        (self.target_dir / 'other.py').write_text(SOURCE)
+        serial = self.analyze()
+        parallel = self.analyze(jobs=2)
+        # Only the workers parse
+        self.assertEqual(parallel.source_store.parses, 0)
+        static = self.analyze(jobs=2, typedef_mode=preanalysis.STATIC)
+        self.assertEqual(static.source_store.parses, 3)
+        self.assertEqual(list(parallel.result.arg_types),
+                         list(serial.result.arg_types))
+        self.assertSameTypes([parallel, static],
+                             get_type_names(serial.result))
+
+    def test_rejected_options(self):
+        with self.assertRaises(ValueError):
+            self.analyze(jobs=2, interprocedural=True)
+        with self.assertRaises(ValueError):
+            self.analyze(lazy=True, call_sites=True)
+        typedef_path = self.tmp_dir / 'typedefs.json'
+        with self.assertWarns(DeprecationWarning):
+            self.analyze(cache_path=typedef_path)
+        self.assertTrue(typedef_path.exists())
+        with self.assertRaises(ValueError):
+            self.analyze(cache_dir=self.cache_dir, cache_path=typedef_path)
+
+    def test_iter_results(self):
+        (self.target_dir / 'other.py').write_text(SOURCE)
+        eager = self.analyze()
+        lazy = self.analyze(lazy=True)
+        self.assertIsNone(lazy.result)
+        records = [analysis.AnalysisResult.make_record(key, arg_types)
+                   for key, arg_types in lazy.iter_results()]
+        self.assertEqual(records, [
+            analysis.AnalysisResult.make_record(key, arg_types)
+            for key, arg_types in eager.iter_results()
+        ])
+        self.assertEqual(lazy.source_store.entries, {})
+        for options in ({'jobs': 2}, {'cache_dir': self.cache_dir},
+                        {'cache_dir': self.cache_dir, 'jobs': 2}):
+            lazy = self.analyze(lazy=True, **options)
+            self.assertEqual(
+                [analysis.AnalysisResult.make_record(key, arg_types)
+                 for key, arg_types in lazy.iter_results()],
+                records, options)
+            self.assertIsNone(lazy.executor)
+        # Warm from the cache of the lazy runs
+        self.assertEqual(lazy.lifted_count, 0)
+        self.assertTrue((self.cache_dir / 'functions.json').exists())
+
+    def test_include_exclude(self):
+        (self.target_dir / 'build').mkdir()
+        (self.target_dir / 'build' / 'other.py').write_text(SOURCE)
+        source_store = source.SourceStore(exclude=['build'])
+        prof = profiler.enable()
+        try:
+            analyzer = self.analyze(source_store=source_store)
+        finally:
+            profiler.disable()
+        self.assertEqual(
+            [x.path.name for x in analyzer.file_infos],
+            ['func.py', 'target.py'])
+        self.assertEqual(source_store.parses, 2)
+        self.assertLessEqual(
+            {'preanalysis', 'parsing', 'cfg build', 'fixpoint',
+             'matching'}, set(prof.get_phase_times()))
+        self.assertEqual(
+            source.SourceStore(include=['build/*']).get_script_paths(
+                self.target_dir), [self.target_dir / 'build' / 'other.py'])
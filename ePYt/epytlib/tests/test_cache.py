@@ -0,0 +1,31 @@
+from .fixtures import FUNC_SOURCE, SOURCE, TARGET_SOURCE, TargetTestCase, \
+    get_type_names
+
+
+class IncrementalTestCase(TargetTestCase):
+    files = {'func.py': FUNC_SOURCE, 'other.py': SOURCE}
+
+    def test_incremental_analysis(self):
+        cold = self.analyze(cache_dir=self.cache_dir)
+        warm = self.analyze(cache_dir=self.cache_dir)
+        self.assertSameTypes([warm], get_type_names(cold.result))
+        self.assertEqual((warm.lifted_count, warm.matched_count), (0, 0))
+        (self.target_dir / 'func.py').write_text(
+            FUNC_SOURCE + '    c.__iter__()\n')
+        edited = self.analyze(cache_dir=self.cache_dir)
+        self.assertEqual((edited.lifted_count, edited.matched_count), (1, 1))
+        (self.target_dir / 'target.py').write_text(
+            TARGET_SOURCE + '    def f(self):\n        pass\n')
+        retyped = self.analyze(cache_dir=self.cache_dir)
+        self.assertEqual(retyped.lifted_count, 1)  # Only C.f is new
+        self.assertEqual(retyped.matched_count, len(retyped.result.arg_types))
+        self.assertSameTypes([retyped], get_type_names(self.analyze().result))
+
+    def test_incremental_parallel_analysis(self):
+        cold = self.analyze(cache_dir=self.cache_dir, jobs=2)
+        self.assertEqual(cold.lifted_count, len(cold.result.arg_types))
+        (self.target_dir / 'func.py').write_text(
+            FUNC_SOURCE + '    c.__iter__()\n')
+        edited = self.analyze(cache_dir=self.cache_dir, jobs=2)
+        self.assertEqual((edited.lifted_count, edited.matched_count), (1, 1))
+        self.assertSameTypes([edited], get_type_names(self.analyze().result))
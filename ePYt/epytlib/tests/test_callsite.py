@@ -0,0 +1,65 @@
+from .. import profiler
+from .fixtures import SEEDED_SOURCE, TargetTestCase, get_type_names
+
+
+class CallSiteTestCase(TargetTestCase):
+    files = {'seeded.py': SEEDED_SOURCE}
+
+    def test_call_site_seeds(self):
+        prof = profiler.enable()
+        try:
+            seeded = self.analyze(call_sites=True)
+        finally:
+            profiler.disable()
+        path = self.target_dir / 'seeded.py'
+        key = (path, None, 'use')
+        names = get_type_names(seeded.result)
+        prefix = 'epyt_test_target.target.'
+        # Seeds come first, C also has method but is never passed
+        self.assertEqual(names[key]['x'],
+                         [prefix + 'A', prefix + 'B', prefix + 'C'])
+        self.assertEqual(names[key]['y'], ['builtins.list', prefix + 'B'])
+        self.assertEqual(names[key]['z'], [prefix + 'B'])
+        # Neither list nor tuple has prop
+        self.assertEqual(names[key]['q'], [prefix + 'A', prefix + 'B'])
+        self.assertNotIn('match.seeded', prof.counters)
+        call_sites = seeded.call_site_index.call_sites
+        self.assertEqual(len(call_sites[key]), 2)
+        # other of a static method is no self
+        self.assertNotIn((path, 'K', 'run'), call_sites)
+
+    def test_narrow_seeds(self):
+        prof = profiler.enable()
+        try:
+            narrowed = self.analyze(call_sites=True, narrow_seeds=True)
+        finally:
+            profiler.disable()
+        key = (self.target_dir / 'seeded.py', None, 'use')
+        names = get_type_names(narrowed.result)
+        prefix = 'epyt_test_target.target.'
+        self.assertEqual(names[key]['x'], [prefix + 'A', prefix + 'B'])
+        self.assertEqual(names[key]['y'], ['builtins.list'])
+        # Without seeds having their attributes, z and q are matched
+        self.assertEqual(names[key]['z'], [prefix + 'B'])
+        self.assertEqual(names[key]['q'], [prefix + 'A', prefix + 'B'])
+        self.assertEqual(prof.counters['match.seeded'], 2)
+        self.assertEqual(list(names[key]), ['x', 'y', 'z', 'q'])
+        for options in ({'jobs': 2}, {'cache_dir': self.cache_dir}):
+            with self.subTest(**options):
+                self.assertSameTypes(
+                    [self.analyze(call_sites=True, narrow_seeds=True,
+                                  **options)], names)
+        # Cached matches without narrowing are not reused
+        self.assertSameTypes(
+            [self.analyze(cache_dir=self.cache_dir, call_sites=True)],
+            get_type_names(self.analyze(call_sites=True).result))
+        with self.assertRaises(ValueError):
+            self.analyze(narrow_seeds=True)
+
+    def test_cached_and_parallel_seeds(self):
+        expected = get_type_names(self.analyze(call_sites=True).result)
+        cold = self.analyze(cache_dir=self.cache_dir, call_sites=True)
+        warm = self.analyze(cache_dir=self.cache_dir, call_sites=True)
+        parallel = self.analyze(jobs=2, call_sites=True)
+        self.assertTrue((self.cache_dir / 'call_sites.json').exists())
+        self.assertSameTypes([cold, warm, parallel], expected)
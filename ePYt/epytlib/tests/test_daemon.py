@@ -0,0 +1,55 @@
+import threading
+
+from .. import daemon, domain
+from .fixtures import FUNC_SOURCE, TARGET_SOURCE, TargetTestCase
+
+
+class DaemonTestCase(TargetTestCase):
+    files = {'func.py': FUNC_SOURCE}
+
+    def test_requests(self):
+        func_path = self.target_dir / 'func.py'
+        address = str(self.tmp_dir / 'epyt.sock')
+        analysis_daemon = daemon.AnalysisDaemon(self.target_dir)
+        attr_count = len(domain.attr_names)
+        server = daemon.make_server(analysis_daemon, address)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            response = daemon.send_request(
+                address, {'command': 'infer_function',
+                          'path': str(func_path), 'function': 'func'})
+            self.assertTrue(response['ok'])
+            self.assertEqual(response['result']['arg_types']['c'],
+                             ['epyt_test_target.target.C'])
+            func_path.write_text(FUNC_SOURCE.replace('len(b)', 'b.method()'))
+            daemon.send_request(address, {'command': 'invalidate',
+                                          'paths': [str(func_path)]})
+            response = daemon.send_request(
+                address, {'command': 'infer_file', 'path': str(func_path)})
+            arg_types = response['result']['functions'][0]['arg_types']
+            self.assertEqual(arg_types['b'], ['epyt_test_target.target.A',
+                                              'epyt_test_target.target.B'])
+            # Any changed project file is seen without invalidation
+            (self.target_dir / 'target.py').write_text(
+                TARGET_SOURCE + '\n    def __init__(self):\n'
+                '        self.x = 1\n')
+            response = daemon.send_request(
+                address, {'command': 'infer_function',
+                          'path': str(func_path), 'function': 'func'})
+            self.assertEqual(response['result']['arg_types']['b'],
+                             ['epyt_test_target.target.A',
+                              'epyt_test_target.target.B',
+                              'epyt_test_target.target.C'])
+            response = daemon.send_request(
+                address, {'command': 'infer_file', 'path': 'missing.py'})
+            self.assertFalse(response['ok'])
+            stats = daemon.send_request(address, {'command': 'stats'})
+            self.assertEqual(stats['result']['infer_file']['count'], 2)
+            # Attribute names were interned by the build processes
+            self.assertEqual(len(domain.attr_names), attr_count)
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+            analysis_daemon.close()
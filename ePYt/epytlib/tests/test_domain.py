@@ -0,0 +1,43 @@
+from unittest import TestCase
+
+from .. import domain
+
+
+class DomainTestCase(TestCase):
+    def test_has_attr_is_a_set(self):
+        left = domain.HasAttr(['x', 'y'], ['__add__'])
+        right = domain.HasAttr(['y', 'x'], ['__add__'])
+        self.assertEqual(left, right)
+        self.assertTrue(domain.HasAttr(['x']) <= left)
+        self.assertFalse(left <= domain.HasAttr(['x']))
+        joined = domain.HasAttr(['x']).join(domain.HasAttr(methods=['f']))
+        self.assertEqual(joined, domain.HasAttr(['x'], ['f']))
+        self.assertTrue(joined.has_method('f'))
+        self.assertFalse(joined.has_property('f'))
+
+    def test_hash_consing(self):
+        table = domain.value_table
+        value = domain.HasAttr.make(domain.to_bits(['x']))
+        self.assertIs(table.hash_cons(domain.HasAttr(['x'])), value)
+        with self.assertRaises(TypeError):
+            value.add_method('f')
+        key = (domain.HasAttr, domain.to_bits(['only_here']), 0)
+        domain.HasAttr.make(*key[1:])
+        self.assertNotIn(key, table.values)  # Dropped once unreferenced
+        self.assertIs(domain.AnyType(), domain.AnyType())
+        other = domain.HasAttr.make(method_bits=domain.to_bits(['f']))
+        cache_hits = table.cache_hits
+        joined = value.join(other)
+        self.assertIs(value.join(other), joined)
+        self.assertEqual(table.cache_hits, cache_hits + 1)
+        self.assertIs(joined, table.hash_cons(domain.HasAttr(['x'], ['f'])))
+        self.assertEqual(joined, domain.HasAttr(['x'], ['f']))
+        self.assertIs(domain.AnyType().meet(value), value)
+        fixed = domain.FixedType.make(value.property_bits)
+        self.assertIs(value.join(fixed), fixed)
+
+    def test_str(self):
+        self.assertEqual(str(domain.HasAttr()),
+                         "HasAttr of Properties: EMPTY Methods: EMPTY")
+        self.assertEqual(str(domain.HasAttr(['x'], ['f', 'g'])),
+                         "HasAttr of Properties: x Methods: f, g")
@@ -0,0 +1,31 @@
+from unittest import TestCase
+
+from .. import domain, memory
+
+
+class MemoryTestCase(TestCase):
+    @staticmethod
+    def make_has_attr(*methods):
+        return domain.HasAttr(methods=methods)
+
+    def test_add_and_fix_are_persistent(self):
+        empty = memory.Memory()
+        added = empty.add(('a', self.make_has_attr('__add__')))
+        self.assertNotIn('a', empty)
+        fixed = added.fix('a')
+        self.assertIsInstance(fixed['a'], domain.FixedType)
+        self.assertNotIsInstance(added['a'], domain.FixedType)
+        # join returns an operand, which fixing the result leaves alone
+        joined = empty.join(added)
+        self.assertIs(joined, added)
+        joined.fix('a')
+        self.assertNotIsInstance(added['a'], domain.FixedType)
+
+    def test_join_shares_unchanged_values(self):
+        value = self.make_has_attr('__iter__')
+        left = memory.Memory().add(('a', value))
+        right = memory.Memory().add(('b', self.make_has_attr('__len__')))
+        joined = left.join(right)
+        self.assertIs(joined['a'], value)
+        self.assertIs(left.join(left), left)
+        self.assertEqual(joined, right.join(left))
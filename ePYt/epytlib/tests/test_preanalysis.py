@@ -0,0 +1,73 @@
+from unittest.mock import patch
+
+from .. import preanalysis
+from .fixtures import TargetTestCase
+
+
+class PreanalysisTestCase(TargetTestCase):
+    @staticmethod
+    def summarize(typedefs):
+        return {name: (sorted(x.type.attributes), sorted(x.base_class_names),
+                       x.init_properties)
+                for name, x in typedefs.items()}
+
+    def test_typedef_cache(self):
+        (self.target_dir / 'sub.py').write_text(
+            'from epyt_test_target.target import A\n'
+            'class D(A):\n'
+            '    pass\n')
+        cache_path = self.cache_dir / 'typedefs.json'
+        expected = preanalysis.get_typedefs(self.target_dir)
+        cold = preanalysis.get_typedefs(self.target_dir, cache_path)
+        warm = preanalysis.get_typedefs(self.target_dir, cache_path)
+        self.assertEqual(self.summarize(cold), self.summarize(expected))
+        self.assertEqual(self.summarize(warm), self.summarize(expected))
+        self.assertTrue(all(x.class_ is None for x in warm.values()))
+        # D inherits from A, so changing target.py invalidates sub.py
+        target_path = self.target_dir / 'target.py'
+        target_path.write_text(target_path.read_text() + '\n')
+        changed = preanalysis.get_typedefs(self.target_dir, cache_path)
+        self.assertIsNotNone(changed['epyt_test_target.sub.D'].class_)
+        self.assertIsNotNone(changed['epyt_test_target.target.C'].class_)
+        sub_path = self.target_dir / 'sub.py'
+        sub_path.write_text(sub_path.read_text() + '\n')
+        changed = preanalysis.get_typedefs(self.target_dir, cache_path)
+        self.assertIsNotNone(changed['epyt_test_target.sub.D'].class_)
+        self.assertIsNone(changed['epyt_test_target.target.C'].class_)
+
+    def test_parallel_typedefs(self):
+        expected = preanalysis.get_typedefs(self.target_dir)
+        (self.target_dir / 'broken.py').write_text(
+            'class E:\n    pass\nraise ValueError("broken")\n')
+        (self.target_dir / 'slow.py').write_text(
+            'import time\nclass F:\n    pass\ntime.sleep(60)\n')
+        (self.target_dir / 'crash.py').write_text(
+            'import os\nclass G:\n    pass\nos._exit(1)\n')
+        # Ignores SIGALRM, so only the parent can stop it
+        (self.target_dir / 'stuck.py').write_text(
+            'import signal, time\nclass H:\n    pass\n'
+            'signal.signal(signal.SIGALRM, signal.SIG_IGN)\n'
+            'time.sleep(60)\n')
+        with self.assertLogs(preanalysis.logger) as logs, \
+                patch.object(preanalysis, 'timeout_grace', 0.5):
+            parallel = preanalysis.get_typedefs(self.target_dir, jobs=2,
+                                                timeout=0.5)
+        with self.assertRaises(ValueError):
+            preanalysis.get_typedefs(self.target_dir, timeout=0.5)
+        self.assertEqual(self.summarize(parallel), self.summarize(expected))
+        self.assertEqual(sorted(x.split(': ')[0].rsplit('/')[-1]
+                                for x in logs.output),
+                         ['broken.py', 'crash.py', 'slow.py', 'stuck.py'])
+
+    def test_static_typedefs(self):
+        (self.target_dir / 'sub.py').write_text(
+            'from .target import A as Base\n'
+            'class D(Base):\n'
+            '    value: int = 0\n'
+            '    @property\n'
+            '    def twice(self):\n'
+            '        return self.value * 2\n')
+        dynamic = preanalysis.get_typedefs(self.target_dir)
+        static = preanalysis.get_typedefs(self.target_dir,
+                                          mode=preanalysis.STATIC)
+        self.assertEqual(self.summarize(static), self.summarize(dynamic))
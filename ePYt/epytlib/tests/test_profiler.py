@@ -0,0 +1,35 @@
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from .. import profiler, semantic
+from .fixtures import make_func_def
+
+
+class ProfilerTestCase(TestCase):
+    def test_profile(self):
+        self.assertIsNone(profiler.current)
+        self.assertIs(profiler.phase('outer'), profiler.no_phase)
+        prof = profiler.enable()
+        try:
+            with profiler.phase('outer'):
+                func_def = make_func_def()
+                result = semantic.Semantic(func_def)
+        finally:
+            profiler.disable()
+        semantic.Semantic(func_def)  # Not recorded
+        self.assertEqual(prof.counters['semantic.runs'], 1)
+        self.assertEqual(prof.counters['semantic.evaluations'],
+                         result.evaluations)
+        self.assertEqual(prof.counters['graph.nodes'],
+                         len(func_def.graph.nodes))
+        self.assertGreater(prof.counters['memory.join'], 0)
+        phase_times = prof.get_phase_times()
+        self.assertLessEqual(sum(phase_times.values()),
+                             prof.get_total_time())
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            collapsed_path = Path(tmp_dir) / 'profile.txt'
+            prof.write_collapsed(collapsed_path)
+            stacks = [x.rsplit(' ', 1)[0]
+                      for x in collapsed_path.read_text().splitlines()]
+        self.assertEqual(stacks, ['outer;cfg build', 'outer'])
@@ -0,0 +1,200 @@
+import tracemalloc
+from unittest import TestCase
+
+from .. import profiler, semantic, table, type_inferrer
+from .fixtures import SOURCE, make_func_def, make_random_source
+
+
+class SemanticTestCase(TestCase):
+    def test_worklist_matches_sweep(self):
+        func_def = make_func_def()
+        sweep = semantic.Semantic(func_def, semantic.Semantic.SWEEP)
+        worklist = semantic.Semantic(func_def, semantic.Semantic.WORKLIST)
+        for node in func_def.graph.nodes:
+            self.assertEqual(sweep.table[node], worklist.table[node])
+        self.assertLess(worklist.evaluations, sweep.evaluations)
+        self.assertTrue(worklist.reached_fixed_point)
+
+    def test_lift_once_per_node(self):
+        func_def = make_func_def()
+        lift_stmts = semantic.Lifter.lift_stmts
+        calls = []
+
+        def counting_lift(lifter, instr_list, handled):
+            calls.append(instr_list)
+            return lift_stmts(lifter, instr_list, handled)
+
+        semantic.Lifter.lift_stmts = counting_lift
+        try:
+            result = semantic.Semantic(func_def, semantic.Semantic.SWEEP)
+        finally:
+            semantic.Lifter.lift_stmts = lift_stmts
+        self.assertEqual(len(calls), len(func_def.graph.nodes))
+        self.assertGreater(result.evaluations, len(calls))
+
+    def test_loop_back_edges(self):
+        func_def = make_func_def('def func(a, b):\n'
+                                 '    while a.test():\n'
+                                 '        a.body()\n'
+                                 '    b.after()\n')
+        header, exit_, body, after = func_def.graph.nodes
+        self.assertEqual(header.prev, [body])
+        self.assertIs(exit_.prev, header.prev)
+        self.assertEqual(after.prev, [exit_])
+        result = semantic.Semantic(func_def)
+        self.assertIn('body', result.table[header]['a'].attributes)
+
+    def test_widening_bounds_nested_loops(self):
+        lines = ['def func(a, b):']
+        for depth in range(32):
+            lines += [f"{'    ' * (depth + 1)}for x{depth} in a:",
+                      f"{'    ' * (depth + 2)}b.method{depth}()"]
+        func_def = make_func_def('\n'.join(lines))
+        for mode in (semantic.Semantic.SWEEP, semantic.Semantic.WORKLIST):
+            result = semantic.Semantic(func_def, mode)
+            self.assertTrue(result.reached_fixed_point)
+            self.assertLessEqual(result.iterations,
+                                 semantic.Semantic.widening_delay + 5)
+            self.assertEqual(
+                len(result.table[func_def.graph.nodes[0]]['b'].methods), 32)
+
+    def test_loop_modes_agree(self):
+        for seed in range(200):
+            func_def = make_func_def(make_random_source(seed))
+            with self.subTest(seed=seed):
+                sweep = semantic.Semantic(func_def, semantic.Semantic.SWEEP)
+                worklist = semantic.Semantic(func_def,
+                                             semantic.Semantic.WORKLIST)
+                self.assertTrue(worklist.reached_fixed_point)
+                for node in func_def.graph.nodes:
+                    self.assertEqual(worklist.table[node], sweep.table[node])
+                self.assertLessEqual(worklist.evaluations, sweep.evaluations)
+
+    def test_widening_limits(self):
+        class UnwidenedSemantic(semantic.Semantic):
+            widening_delay = semantic.Semantic.max_node_evaluations
+
+        join_table = type_inferrer.TypeInferrer.join_table
+        func_def = make_func_def('def func(a, b):\n'
+                                 '    for x in a:\n'
+                                 '        b = a.first\n'
+                                 '        while a.test():\n'
+                                 '            a.prop\n'
+                                 '    a = a.foo\n'
+                                 '    a.bar\n')
+        # bar is only required of what a.foo returns
+        joined = join_table(semantic.Semantic(func_def).table)
+        self.assertNotIn('bar', joined['a'].attributes)
+        for seed in range(200):
+            func_def = make_func_def(make_random_source(seed))
+            with self.subTest(seed=seed):
+                unwidened = UnwidenedSemantic(func_def)
+                self.assertTrue(unwidened.reached_fixed_point)
+                self.assertEqual(
+                    join_table(semantic.Semantic(func_def).table),
+                    join_table(unwidened.table))
+
+    def test_iteration_cap(self):
+        func_def = make_func_def('def func(a, b):\n'
+                                 '    while a:\n'
+                                 '        a.body()\n'
+                                 '        b = a\n')
+
+        class CappedSemantic(semantic.Semantic):
+            max_node_evaluations = 1
+
+        prof = profiler.enable()
+        try:
+            with self.assertLogs(semantic.logger, 'WARNING') as logs:
+                result = CappedSemantic(func_def, semantic.Semantic.SWEEP)
+        finally:
+            profiler.disable()
+        self.assertFalse(result.reached_fixed_point)
+        self.assertEqual(prof.counters['semantic.capped'], 1)
+        self.assertIn('func (line 1)', logs.output[0])
+
+    def test_sparse(self):
+        join_table = type_inferrer.TypeInferrer.join_table
+        dropped = 0
+        for seed in range(200):
+            func_def = make_func_def(
+                make_random_source(seed, loop_free=seed % 2 == 0))
+            for graph_ in (func_def.graph, func_def.graph.to_compact()):
+                func_def.graph = graph_
+                for mode in (semantic.Semantic.SWEEP,
+                             semantic.Semantic.WORKLIST):
+                    with self.subTest(seed=seed, graph=graph_, mode=mode):
+                        dense = semantic.Semantic(func_def, mode)
+                        sparse = semantic.Semantic(func_def, mode,
+                                                   sparse=True)
+                        self.assertLessEqual(sparse.evaluations,
+                                             dense.evaluations)
+                        dropped += sparse.reps is not None
+                        for node in graph_.nodes:
+                            self.assertEqual(sparse.get_memory(node),
+                                             dense.table[node])
+                        self.assertEqual(
+                            join_table(sparse.get_node_table()),
+                            join_table(dense.table))
+        self.assertGreater(dropped, 0)
+
+    # Peak of a run, whose result is dropped so that it does not weigh on
+    # the next one
+    @staticmethod
+    def get_peak_bytes(func_def, storage):
+        tracemalloc.start()
+        try:
+            semantic.Semantic(func_def, storage=storage)
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    def test_merge_storage(self):
+        straight_line = 'def func(a, b):\n' + ''.join(
+            f"    a.method{i % 50}()\n    b.prop{i % 30}\n"
+            for i in range(500))
+        for source in (SOURCE, straight_line):
+            func_def = make_func_def(source)
+            full = semantic.Semantic(
+                func_def, storage=semantic.Semantic.FULL_STORAGE)
+            merge = semantic.Semantic(
+                func_def, storage=semantic.Semantic.MERGE_STORAGE)
+            self.assertLess(len(merge.table.keys()), len(full.table.keys()))
+            for node in func_def.graph.nodes:
+                self.assertEqual(merge.get_memory(node), full.table[node])
+            self.assertEqual(
+                type_inferrer.TypeInferrer.join_table(
+                    merge.get_node_table()),
+                type_inferrer.TypeInferrer.join_table(full.table))
+        self.assertEqual(len(merge.table.keys()), 2)  # Entry and exit
+        del full, merge
+        full_peak = self.get_peak_bytes(func_def,
+                                        semantic.Semantic.FULL_STORAGE)
+        merge_peak = self.get_peak_bytes(func_def,
+                                         semantic.Semantic.MERGE_STORAGE)
+        # Lifted facts are held by both, the peak is about two thirds
+        self.assertLess(merge_peak, full_peak * 0.8)
+
+    def test_compact_graph(self):
+        func_def = make_func_def()
+        compact_def = make_func_def()
+        compact_def.graph = func_def.graph.to_compact()
+        compact = compact_def.graph
+        nodes = func_def.graph.nodes
+        ids = {node: index for index, node in enumerate(nodes)}
+        succs = func_def.graph.get_succs()
+        for node in nodes:
+            self.assertEqual(list(compact.preds[ids[node]]),
+                             [ids[x] for x in node.prev])
+            self.assertEqual(list(compact.succs[ids[node]]),
+                             [ids[x] for x in succs[node]])
+        self.assertEqual(compact.reverse_postorder(),
+                         [ids[x] for x in func_def.graph.reverse_postorder()])
+        for mode in (semantic.Semantic.SWEEP, semantic.Semantic.WORKLIST):
+            expected = semantic.Semantic(func_def, mode)
+            result = semantic.Semantic(compact_def, mode)
+            self.assertIsInstance(result.table, table.ArrayTable)
+            for node in nodes:
+                self.assertEqual(result.table[ids[node]],
+                                 expected.table[node])
+            self.assertEqual(result.evaluations, expected.evaluations)
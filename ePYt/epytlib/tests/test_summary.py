@@ -0,0 +1,21 @@
+from .fixtures import CALLS_SOURCE, TargetTestCase, get_type_names
+
+
+class InterproceduralTestCase(TargetTestCase):
+    files = {'calls.py': CALLS_SOURCE}
+
+    def test_interprocedural(self):
+        cold = self.analyze(cache_dir=self.cache_dir, interprocedural=True)
+        warm = self.analyze(cache_dir=self.cache_dir, interprocedural=True)
+        intra = self.analyze()
+        path = self.target_dir / 'calls.py'
+        names = get_type_names(cold.result)
+        a_and_b = ['epyt_test_target.target.A', 'epyt_test_target.target.B']
+        self.assertEqual(names[(path, 'D', 'add')]['o'], a_and_b)
+        self.assertEqual(names[(path, None, 'run')]['x'], a_and_b)
+        # x needs both the method of even and the prop of odd, unlike C
+        self.assertEqual(names[(path, None, 'even')]['x'], a_and_b)
+        self.assertNotIn('o', get_type_names(intra.result)[
+            (path, 'D', 'add')])
+        self.assertSameTypes([warm], names)
+        self.assertEqual(warm.lifted_count, 0)
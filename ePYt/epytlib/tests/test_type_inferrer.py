@@ -0,0 +1,73 @@
+import itertools
+import random
+
+from .. import analysis, preanalysis, semantic, type_inferrer
+from .fixtures import FUNC_SOURCE, TargetTestCase, get_type_names, \
+    make_func_def, make_random_source
+
+
+# Module level, so that worker processes can unpickle it
+class FirstTypeInferrer(type_inferrer.TypeInferrer):
+    def infer_table(self, table):
+        return {arg_key: user_types[:1] for arg_key, user_types in
+                super().infer_table(table).items()}
+
+
+class FirstAnalyzer(analysis.Analyzer):
+    type_inferrer_class = FirstTypeInferrer
+
+
+class TypeInferrerTestCase(TargetTestCase):
+    def test_match_candidates_equal_filter(self):
+        inferrer = type_inferrer.TypeInferrer(self.target_dir)
+        attrs = ['prop', 'x', 'y', 'method', '__len__', '__iter__', 'z',
+                 '__class__']
+        for size in range(3):
+            for lifted_attrs in itertools.combinations(attrs, size):
+                expected = list(filter(
+                    lambda x: inferrer.match(x.type.attributes, lifted_attrs),
+                    inferrer.user_types.values()))
+                self.assertEqual(inferrer.match_candidates(lifted_attrs),
+                                 expected)
+
+    def test_infer_many_equal_infer(self):
+        inferrer = type_inferrer.TypeInferrer(self.target_dir)
+        func_defs = [make_func_def(), make_func_def(FUNC_SOURCE)]
+        expected = list(map(inferrer.infer, func_defs))
+        self.assertEqual(inferrer.infer_many(func_defs), expected)
+        attrs = [['method'], [], ['x', 'prop'], ['z'], ['__len__', 'y']]
+        self.assertEqual(inferrer.match_many(attrs),
+                         list(map(inferrer.match_candidates, attrs)))
+
+    def test_merge_storage_types(self):
+        rand = random.Random(0)
+        attr_pool = ['__iter__'] + [f"{kind}{n}" for kind in 'mpqw'
+                                    for n in range(4)]
+        user_types = {}
+        for index in range(40):
+            class_ = type(f"Type{index}", (),
+                          dict.fromkeys(rand.sample(attr_pool, 8)))
+            typedef = preanalysis.TypeDef(class_)
+            user_types[typedef.class_name] = typedef
+        inferrer = type_inferrer.TypeInferrer(None, user_types)
+        for seed in range(300):
+            func_def = make_func_def(make_random_source(seed))
+            with self.subTest(seed=seed):
+                full = semantic.Semantic(
+                    func_def, storage=semantic.Semantic.FULL_STORAGE)
+                self.assertEqual(inferrer.infer(func_def),
+                                 inferrer.infer_table(full.table))
+
+    def test_infer_table_override(self):
+        (self.target_dir / 'func.py').write_text(FUNC_SOURCE)
+        expected = {
+            key: {arg_key: names[:1] for arg_key, names in x.items()}
+            for key, x in get_type_names(self.analyze().result).items()
+        }
+        for options in ({}, {'jobs': 2}, {'cache_dir': self.cache_dir},
+                        {'cache_dir': self.tmp_dir / 'jobs_cache',
+                         'jobs': 2},
+                        {'interprocedural': True}):
+            with self.subTest(**options):
+                self.assertSameTypes(
+                    [self.analyze(FirstAnalyzer, **options)], expected)
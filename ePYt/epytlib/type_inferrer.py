@@ -1,30 +1,230 @@
-from . import preanalysis, semantic, memory
+from . import preanalysis, profiler, semantic, memory
+from bisect import bisect_right
 from functools import reduce
+import hashlib
+import json
+
+try:
+    import numpy as np
+except ImportError:  # match_many falls back to match_candidates
+    np = None
 
 
 class TypeInferrer:
-    def __init__(self, dir_path):
-        self.user_types = preanalysis.get_typedefs(dir_path)
-        self.table = None
+    # Upper bound of bytes of user type bitmaps gathered at once
+    matrix_chunk_size = 1 << 22
+
+    # With narrow_seeds, arguments with seeds having their attributes are
+    # inferred as those seeds only, see match_lifted_attrs
+    def __init__(self, dir_path, user_types=None, cache_path=None,
+                 jobs=None, timeout=None, typedef_mode=preanalysis.DYNAMIC,
+                 source_store=None, narrow_seeds=False):
+        if user_types is None:
+            with profiler.phase('preanalysis'):
+                user_types = preanalysis.get_typedefs(
+                    dir_path, cache_path, jobs, timeout, typedef_mode,
+                    source_store)
+        self.user_types = user_types
+        self.narrow_seeds = narrow_seeds
+        self.user_type_list = list(self.user_types.values())
+        self.attr_index = self.build_attr_index(self.user_type_list)
+
+    # Maps each attribute name to the set of indices of user types having it
+    @staticmethod
+    def build_attr_index(user_type_list):
+        attr_index = {}
+        for index, user_type in enumerate(user_type_list):
+            for attr in user_type.type.attributes:
+                attr_index.setdefault(attr, set()).add(index)
+        return attr_index
 
     @staticmethod
     def match(user_type_attrs, lifted_value_attrs):
         return set(user_type_attrs).issuperset(lifted_value_attrs)
 
+    # Same result as filtering user types with match, in the same order
+    def match_candidates(self, lifted_value_attrs):
+        prof = profiler.current
+        if not lifted_value_attrs:
+            if prof is not None:
+                prof.count('match.candidates', len(self.user_type_list))
+            return list(self.user_type_list)
+        postings = []
+        for attr in set(lifted_value_attrs):
+            if attr not in self.attr_index:
+                return []
+            postings.append(self.attr_index[attr])
+        postings.sort(key=len)
+        if prof is not None:  # Intersecting checks the smallest posting
+            prof.count('match.candidates', len(postings[0]))
+        candidates = set.intersection(*postings)
+        return [self.user_type_list[index] for index in sorted(candidates)]
+
+    # match_candidates for many attribute lists at once. Each distinct
+    # attribute set is matched by AND-reducing packed bitmaps (one bit per
+    # user type) of its attributes, a chunk of sets per numpy operation.
+    def match_many(self, lifted_values_attrs):
+        if np is None:
+            return list(map(self.match_candidates, lifted_values_attrs))
+        attr_sets = {}
+        for attrs in lifted_values_attrs:
+            attr_sets.setdefault(frozenset(attrs), None)
+        columns = {}
+        for attr_set in attr_sets:
+            for attr in attr_set:
+                columns.setdefault(attr, len(columns))
+        type_count = len(self.user_type_list)
+        prof = profiler.current
+        if prof is not None:  # Every user type of every distinct set
+            prof.count('match.candidates', len(attr_sets) * type_count)
+        type_matrix = np.zeros((len(columns) + 1, type_count), dtype=bool)
+        type_matrix[-1] = True  # Padding column every user type has
+        for attr, column in columns.items():
+            if attr in self.attr_index:
+                type_matrix[column, list(self.attr_index[attr])] = True
+        type_bitmaps = np.packbits(type_matrix, axis=1)
+        pad = len(columns)
+        sorted_sets = sorted(attr_sets, key=len)
+        lengths = list(map(len, sorted_sets))
+        start = 0
+        while start < len(sorted_sets):
+            # Sets of a chunk are padded up to the same width
+            width = max(1, lengths[start])
+            chunk = max(1, self.matrix_chunk_size //
+                        (width * type_bitmaps.shape[1] + 1))
+            end = min(start + chunk, bisect_right(lengths, width))
+            chunk_sets = sorted_sets[start:end]
+            arg_matrix = np.full((len(chunk_sets), width), pad, dtype=np.intp)
+            for row, attr_set in enumerate(chunk_sets):
+                arg_matrix[row, :len(attr_set)] = \
+                    [columns[attr] for attr in attr_set]
+            matched = np.bitwise_and.reduce(type_bitmaps[arg_matrix], axis=1)
+            matched = np.unpackbits(matched, axis=1, count=type_count)
+            for attr_set, row in zip(chunk_sets, matched):
+                attr_sets[attr_set] = [self.user_type_list[index]
+                                       for index in np.flatnonzero(row)]
+            start = end
+        return [list(attr_sets[frozenset(attrs)])
+                for attrs in lifted_values_attrs]
+
+    @staticmethod
+    def join_table(table):
+        return reduce(lambda x, y: x.join(y), table.values(),
+                      memory.Memory())
+
     # Override me on your inference strategy
     def infer_table(self, table):
-        joined_memory = reduce(lambda x, y: x.join(y),
-                               table.table.values(),
-                               memory.Memory())
+        joined_memory = self.join_table(table)
         inferred_user_types = {}
-        for arg_key, lifted_value in joined_memory.memory.items():
-            inferred_user_types[arg_key] = list(
-                filter(
-                    lambda x: self.match(x.type.attributes,
-                                         lifted_value.attributes),
-                    self.user_types.values()))
+        with profiler.phase('matching'):
+            for arg_key, lifted_value in joined_memory.memory.items():
+                inferred_user_types[arg_key] = \
+                    self.match_candidates(lifted_value.attributes)
         return inferred_user_types
 
+    # Each function gets its own table, nothing is kept between calls.
+    # Only memories at merge points and exits are stored, those of the other
+    # nodes being recomputed in node order while the table is joined.
+    @staticmethod
+    def get_table(func_def):
+        with profiler.phase('fixpoint'):
+            return semantic.Semantic(
+                func_def, storage=semantic.Semantic.MERGE_STORAGE
+            ).get_node_table()
+
     def infer(self, func_def):
-        self.table = semantic.Semantic(func_def).table
-        return self.infer_table(self.table)
+        return self.infer_table(self.get_table(func_def))
+
+    # Batch matching bypasses infer_table, so a subclass overriding it is
+    # given every table instead
+    def overrides_infer_table(self):
+        return type(self).infer_table is not TypeInferrer.infer_table
+
+    # {arg_key: attribute names} of the joined memory of a table
+    @classmethod
+    def get_table_attrs(cls, table):
+        joined_memory = cls.join_table(table)
+        return {arg_key: lifted_value.attributes
+                for arg_key, lifted_value in joined_memory.memory.items()}
+
+    # {arg_key: attribute names} of the joined memory of func_def
+    def get_lifted_attrs(self, func_def):
+        return self.get_table_attrs(self.get_table(func_def))
+
+    # Same result as infer_table for each {arg_key: attribute names}.
+    # all_seeds has {arg_key: [TypeDef]} of arguments whose candidates are
+    # known from elsewhere, e.g. call sites. Seeds having the attributes of
+    # an argument come first among its inferred types, followed by the
+    # matching user types that are no seeds, so seeds never narrow the
+    # result. With narrow_seeds, such seeds are the inferred types and the
+    # argument is not matched against the user types at all.
+    def match_lifted_attrs(self, all_lifted_attrs, all_seeds=None):
+        arg_keys = []
+        lifted_values_attrs = []
+        inferred_user_types = [{} for _ in all_lifted_attrs]
+        prof = profiler.current
+        for index, lifted_attrs in enumerate(all_lifted_attrs):
+            seeds = {} if all_seeds is None else all_seeds[index]
+            for arg_key, attrs in lifted_attrs.items():
+                seeded = self.get_seeded(seeds[arg_key], attrs) \
+                    if self.narrow_seeds and arg_key in seeds else None
+                # Filled in after matching, in the order of lifted_attrs
+                inferred_user_types[index][arg_key] = seeded
+                if seeded:
+                    if prof is not None:
+                        prof.count('match.seeded')
+                    continue
+                arg_keys.append((index, arg_key))
+                lifted_values_attrs.append(attrs)
+        with profiler.phase('matching'):
+            matched_types = self.match_many(lifted_values_attrs)
+        for (index, arg_key), user_types in zip(arg_keys, matched_types):
+            if all_seeds is not None and arg_key in all_seeds[index]:
+                user_types = self.add_seeds(
+                    all_seeds[index][arg_key],
+                    all_lifted_attrs[index][arg_key], user_types)
+            inferred_user_types[index][arg_key] = user_types
+        return inferred_user_types
+
+    # Seeds having the lifted attributes, in seed order
+    def get_seeded(self, seeds, lifted_value_attrs):
+        return [x for x in seeds
+                if self.match(x.type.attributes, lifted_value_attrs)]
+
+    def add_seeds(self, seeds, lifted_value_attrs, user_types):
+        seeded = self.get_seeded(seeds, lifted_value_attrs)
+        if self.narrow_seeds and seeded:
+            return seeded
+        return seeded + [x for x in user_types if x not in seeded]
+
+    # Same result as infer_table on each table, with seeds applied as by
+    # match_lifted_attrs. Arguments of all tables are matched at once,
+    # unless infer_table is overridden, which then infers every argument.
+    def infer_tables(self, tables, all_seeds=None):
+        if not self.overrides_infer_table():
+            return self.match_lifted_attrs(
+                list(map(self.get_table_attrs, tables)), all_seeds)
+        all_inferred_types = []
+        for index, table in enumerate(tables):
+            inferred_types = self.infer_table(table)
+            seeds = {} if all_seeds is None else all_seeds[index]
+            if seeds:
+                lifted_attrs = self.get_table_attrs(table)
+                for arg_key, user_types in inferred_types.items():
+                    if arg_key in seeds and arg_key in lifted_attrs:
+                        inferred_types[arg_key] = self.add_seeds(
+                            seeds[arg_key], lifted_attrs[arg_key],
+                            user_types)
+            all_inferred_types.append(inferred_types)
+        return all_inferred_types
+
+    # Same result as infer on each func_def
+    def infer_many(self, func_defs, all_seeds=None):
+        return self.infer_tables(map(self.get_table, func_defs), all_seeds)
+
+    # Hash of the user types and their attributes, in matching order
+    def get_fingerprint(self):
+        user_type_attrs = [(x.class_name, sorted(x.type.attributes))
+                           for x in self.user_type_list]
+        return hashlib.sha256(
+            json.dumps(user_type_attrs).encode()).hexdigest()